@@ -8,23 +8,75 @@
 # - Memory-efficient streaming reads/writes
 
 import sys
+import io
 from collections import Counter, OrderedDict
 import itertools
+import heapq
 from itertools import islice, count, groupby
 import pandas as pd
+import numpy as np
 import os
 import re
+import struct
 from operator import itemgetter
 from time import time
 from pathlib import Path
 import pickle
 from google.cloud import storage
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+import weakref
 from collections import defaultdict
+from array import array
+from functools import partial
 from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from functools import lru_cache
+try:
+    from numba import njit
+except ImportError:  # Numba is optional, posting lists are then decoded with plain NumPy
+    njit = None
 
 # Google Cloud Project ID
 PROJECT_ID = 'warm-skill-481016-r0'
 
+# Keep-alive HTTPS connections held open to GCS (shared by all concurrent reads)
+GCS_POOL_SIZE = 32
+
+@lru_cache(maxsize=1)
+def _client():
+    """
+    Get the shared Google Cloud Storage client.
+    
+    Creating a client runs credential discovery and opens a new HTTPS
+    session, so it is done once per process and reused by every bucket.
+    The session pools up to GCS_POOL_SIZE keep-alive connections, so the
+    concurrent range reads and downloads reuse open TLS connections
+    instead of discarding them once the default pool of 10 is full.
+    
+    Returns:
+        storage.Client object
+    """
+    credentials, _ = google.auth.default(scopes=storage.Client.SCOPE)
+    session = AuthorizedSession(credentials)
+    session.mount('https://', HTTPAdapter(pool_connections=GCS_POOL_SIZE, pool_maxsize=GCS_POOL_SIZE))
+    return storage.Client(PROJECT_ID, credentials=credentials, _http=session)
+
+# A forked child (e.g. a gunicorn --preload worker) must not share the parent's connections
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_client.cache_clear)
+
+def get_client():
+    """
+    Get the shared Google Cloud Storage client (see _client()).
+    
+    Returns:
+        storage.Client object
+    """
+    return _client()
+
 def get_bucket(bucket_name):
     """
     Get a reference to a Google Cloud Storage bucket.
@@ -35,7 +87,44 @@ def get_bucket(bucket_name):
     Returns:
         storage.Bucket object
     """
-    return storage.Client(PROJECT_ID).bucket(bucket_name)
+    return _client().bucket(bucket_name)
+
+class _BufferedBlobWriter:
+    """
+    Write-only file object for a GCS blob that uploads in a single request.
+    
+    blob.open('wb') starts a resumable upload session and sends the data in
+    chunks. MultiFileWriter's files are small (at most BLOCK_SIZE), so it is
+    cheaper to keep the whole content in memory and upload it with one PUT
+    on close(). Only used for those files: large pickles are still streamed
+    through blob.open('wb') by _open().
+    """
+    
+    def __init__(self, blob):
+        """
+        Args:
+            blob: storage.Blob to upload to
+        """
+        self._blob = blob
+        self._buf = io.BytesIO()
+
+    def write(self, b):
+        """Append binary data to the in-memory buffer."""
+        return self._buf.write(b)
+
+    def close(self):
+        """Upload the buffered content (without copying it). Further calls do nothing."""
+        if self._buf is not None:
+            self._buf.seek(0)
+            self._blob.upload_from_file(self._buf, content_type='application/octet-stream')
+            self._buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
 
 def _open(path, mode, bucket=None):
     """
@@ -85,10 +174,23 @@ class MultiFileWriter:
         self._name = name
         self._bucket = None if bucket_name is None else get_bucket(bucket_name)
         # Generator that creates files with sequential numbering
-        self._file_gen = (_open(str(self._base_dir / f'{name}_{i:03}.bin'), 
-                                'wb', self._bucket) 
+        # (GCS files are at most BLOCK_SIZE, so each is buffered and uploaded with one PUT)
+        self._file_gen = (self._open_file(str(self._base_dir / f'{name}_{i:03}.bin'))
                           for i in itertools.count())
         self._f = next(self._file_gen)
+        self._cur_name = self._file_name(self._f)  # Resolved once per file, not per write
+        self._pos = 0  # Bytes written to the current file (avoids f.tell() per write)
+
+    def _open_file(self, path):
+        """Open one output file: a local file, or a buffered single-PUT GCS writer."""
+        if self._bucket is None:
+            return open(path, 'wb')
+        return _BufferedBlobWriter(self._bucket.blob(path))
+
+    @staticmethod
+    def _file_name(f):
+        """Path of an open output file: local files have .name, GCS writers wrap a blob."""
+        return f.name if hasattr(f, 'name') else f._blob.name
            
     def write(self, b):
         """
@@ -104,20 +206,23 @@ class MultiFileWriter:
             List of (filename, offset) tuples indicating where each chunk was written
         """
         locs = []
+        b = memoryview(b)  # Slicing a memoryview does not copy the remaining data
         while len(b) > 0:
-            pos = self._f.tell()  # Current position in file
+            pos = self._pos  # Current position in file
             remaining = BLOCK_SIZE - pos  # Space left in current file
             
             # If current file is full, create a new one
             if remaining == 0:  
                 self._f.close()
                 self._f = next(self._file_gen)
+                self._cur_name = self._file_name(self._f)
                 pos, remaining = 0, BLOCK_SIZE
             
             # Write what fits in current file
-            self._f.write(b[:remaining])
-            name = self._f.name if hasattr(self._f, 'name') else self._f._blob.name
-            locs.append((name, pos))
+            chunk = b[:remaining]
+            self._f.write(chunk)
+            self._pos = pos + len(chunk)
+            locs.append((self._cur_name, pos))
             b = b[remaining:]  # Continue with remaining data
         return locs
 
@@ -125,12 +230,46 @@ class MultiFileWriter:
         """Close the current file. Always call this when done writing."""
         self._f.close()
 
+# Maximum number of concurrent GCS range requests issued by MultiFileReader
+READ_WORKERS = 8
+# Threads shared by all concurrent per-term posting reads (see _term_read_pool)
+TERM_READ_WORKERS = 32
+
+_term_pool = None
+_term_pool_lock = threading.Lock()
+
+def _term_read_pool():
+    """
+    Thread pool shared by every read_posting_arrays() / submit_posting_reads()
+    call, created on first use. Queries submit their term reads here instead
+    of starting (and tearing down) a pool of their own.
+    
+    Returns:
+        ThreadPoolExecutor
+    """
+    global _term_pool
+    with _term_pool_lock:
+        if _term_pool is None:
+            _term_pool = ThreadPoolExecutor(max_workers=TERM_READ_WORKERS)
+        return _term_pool
+
+def _reset_term_read_pool():
+    """Drop the parent's pool in a forked child (its threads do not survive the fork)."""
+    global _term_pool, _term_pool_lock
+    _term_pool = None
+    _term_pool_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_term_read_pool)
+
 class MultiFileReader:
     """
-    Sequential binary reader of multiple files of up to BLOCK_SIZE each.
+    Binary reader of multiple files of up to BLOCK_SIZE each.
     
     Reads binary data that was written by MultiFileWriter, potentially spanning
-    multiple files. Maintains a cache of open file handles for efficiency.
+    multiple files. Local files are read through a cache of open file handles.
+    On GCS, every chunk is fetched with its own HTTP range request and chunks
+    of the same read are downloaded concurrently.
     
     Usage:
         reader = MultiFileReader('input_dir', 'my-bucket')
@@ -149,6 +288,34 @@ class MultiFileReader:
         self._base_dir = Path(base_dir)
         self._bucket = None if bucket_name is None else get_bucket(bucket_name)
         self._open_files = {}  # Cache of open file handles
+        self._lock = threading.Lock()  # Local file handles are shared by all reading threads
+        self._executor = None  # Thread pool for concurrent range reads (created on demand)
+
+    def _read_range(self, f_name_str, offset, n_read):
+        """
+        Read n_read bytes starting at offset from a single file.
+        
+        On GCS this is a single ranged GET, so no blob reader state is kept.
+        
+        Args:
+            f_name_str: Path of the file (local or GCS)
+            offset: Position to start reading from
+            n_read: Number of bytes to read
+        
+        Returns:
+            Binary data (bytes)
+        """
+        if self._bucket is not None:
+            return self._bucket.blob(f_name_str).download_as_bytes(
+                start=offset, end=offset + n_read - 1)
+        
+        with self._lock:
+            # Open file if not already in cache
+            if f_name_str not in self._open_files:
+                self._open_files[f_name_str] = _open(f_name_str, 'rb')
+            f = self._open_files[f_name_str]
+            f.seek(offset)  # Move to the specified position
+            return f.read(n_read)
 
     def read(self, locs, n_bytes):
         """
@@ -156,31 +323,61 @@ class MultiFileReader:
         
         Args:
             locs: List of (filename, offset) tuples from MultiFileWriter.write()
+                  (compressed posting lists store (filename, offset, nbytes))
             n_bytes: Total number of bytes to read
         
         Returns:
             Binary data (bytes) concatenated from all locations
         """
-        b = []
-        for f_name, offset in locs:
+        return b"".join(self.read_ranges(self.ranges(locs, n_bytes)))
+
+    def ranges(self, locs, n_bytes):
+        """
+        Split a read into the byte ranges it covers in each file.
+        
+        Args:
+            locs: Locations as passed to read()
+            n_bytes: Total number of bytes to read
+        
+        Returns:
+            List of (file path, offset, number of bytes) tuples
+        """
+        ranges = []
+        for f_name, offset, *_ in locs:
             # Support both full paths and relative paths (extract basename)
             f_name_str = str(self._base_dir / os.path.basename(f_name))
-            
-            # Open file if not already in cache
-            if f_name_str not in self._open_files:
-                self._open_files[f_name_str] = _open(f_name_str, 'rb', self._bucket)
-            
-            f = self._open_files[f_name_str]
-            f.seek(offset)  # Move to the specified position
             n_read = min(n_bytes, BLOCK_SIZE - offset)  # Read up to end of block
-            b.append(f.read(n_read))
+            ranges.append((f_name_str, offset, n_read))
             n_bytes -= n_read
-        return b"".join(b)  # Concatenate all chunks
+        return ranges
+
+    def read_ranges(self, ranges):
+        """
+        Read several byte ranges, concurrently on GCS.
+        
+        Args:
+            ranges: List of (file path, offset, number of bytes) tuples
+        
+        Returns:
+            List of binary data (bytes), one per range, in the same order
+        """
+        # Local reads and single-chunk reads gain nothing from the thread pool
+        if self._bucket is None or len(ranges) == 1:
+            return [self._read_range(*r) for r in ranges]
+        
+        with self._lock:  # The reader is shared by concurrent queries
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=READ_WORKERS)
+        # map() returns results in submission order, so chunks stay in sequence
+        return list(self._executor.map(lambda r: self._read_range(*r), ranges))
   
     def close(self):
         """Close all open file handles. Always call this when done reading."""
         for f in self._open_files.values():
             f.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
 
     def __exit__(self, exc_type, exc_value, traceback):
         """Context manager support: automatically close files when exiting 'with' block."""
@@ -191,6 +388,434 @@ class MultiFileReader:
 # Each posting list entry is a (doc_id, term_frequency) pair
 TUPLE_SIZE = 6       # 6 bytes per entry: 4 bytes for doc_id + 2 bytes for term_frequency
 TF_MASK = 2 ** 16 - 1  # Mask to extract term_frequency (16-bit value) 
+# NumPy view of a single 6-byte posting: big-endian 4-byte doc_id + 2-byte tf
+POSTING_DTYPE = np.dtype([('doc_id', '>u4'), ('tf', '>u2')])
+# Same layout as a struct format, for unpacking straight into (doc_id, tf) tuples
+POSTING_STRUCT = struct.Struct('>IH')
+
+def _decode_posting_list(b):
+    """
+    Decode a binary posting list into two parallel NumPy arrays.
+    
+    The whole buffer is decoded at once with np.frombuffer instead of slicing
+    and calling int.from_bytes twice per posting in Python.
+    A trailing partial entry (if any) is ignored.
+    
+    Args:
+        b: Binary data (bytes) as read by MultiFileReader.read()
+    
+    Returns:
+        Tuple (doc_ids, tfs) of native-endian NumPy arrays (uint32, uint16)
+    """
+    arr = np.frombuffer(b, dtype=POSTING_DTYPE, count=len(b) // TUPLE_SIZE)
+    return arr['doc_id'].astype(np.uint32), arr['tf'].astype(np.uint16)
+
+def _vbyte_encode(values):
+    """
+    Variable-byte encode a sequence of non-negative integers.
+    
+    Each value is split into 7-bit groups (least significant first); the high
+    bit marks the last byte of a value. Small values (e.g. doc_id gaps and
+    term frequencies) take a single byte instead of a fixed 2 or 4.
+    
+    Args:
+        values: Sequence or NumPy array of non-negative integers
+    
+    Returns:
+        Binary data (bytes)
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b''
+    # Number of 7-bit groups needed for each value (at least one)
+    n_groups = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        n_groups += rest > 0
+        rest >>= np.uint64(7)
+    ends = np.cumsum(n_groups)
+    starts = ends - n_groups
+    owner = np.repeat(np.arange(len(values)), n_groups)  # Value index of each output byte
+    shifts = ((np.arange(ends[-1]) - starts[owner]) * 7).astype(np.uint64)
+    out = ((values[owner] >> shifts) & np.uint64(0x7F)).astype(np.uint8)
+    out[ends - 1] |= 0x80  # Stop bit on the last byte of every value
+    return out.tobytes()
+
+if njit is not None:
+    @njit(cache=True)
+    def _vbyte_decode_jit(buf):
+        """
+        Numba-compiled VByte decoder: a counting pass plus a decoding pass over
+        the bytes, with no temporary arrays. Bytes after the last complete
+        value are ignored.
+        
+        Args:
+            buf: NumPy uint8 array
+        
+        Returns:
+            NumPy uint64 array of the decoded values
+        """
+        # The number of values is known before decoding (one stop bit each), so
+        # the output is sized exactly instead of for the worst case len(buf)
+        n = 0
+        for i in range(len(buf)):
+            if buf[i] & 0x80:
+                n += 1
+        out = np.empty(n, dtype=np.uint64)
+        n = 0
+        value = np.uint64(0)
+        shift = np.uint64(0)
+        for i in range(len(buf)):
+            byte = np.uint64(buf[i])
+            value |= (byte & np.uint64(0x7F)) << shift
+            if byte & np.uint64(0x80):
+                out[n] = value
+                n += 1
+                value = np.uint64(0)
+                shift = np.uint64(0)
+            else:
+                shift += np.uint64(7)
+        return out
+else:
+    _vbyte_decode_jit = None
+
+def _vbyte_decode(b):
+    """
+    Decode a buffer written by _vbyte_encode().
+    Bytes after the last complete value are ignored.
+    
+    Uses the Numba kernel when Numba is installed, otherwise a vectorized
+    NumPy pass (stop-bit positions + reduceat).
+    
+    Args:
+        b: Binary data (bytes)
+    
+    Returns:
+        NumPy uint64 array of the decoded values
+    """
+    buf = np.frombuffer(b, dtype=np.uint8)
+    if _vbyte_decode_jit is not None:
+        return _vbyte_decode_jit(buf)
+    ends = np.flatnonzero(buf & 0x80)
+    if len(ends) == 0:
+        return np.empty(0, dtype=np.uint64)
+    buf = buf[:ends[-1] + 1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    owner = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = ((np.arange(len(buf)) - starts[owner]) * 7).astype(np.uint64)
+    return np.add.reduceat((buf & 0x7F).astype(np.uint64) << shifts, starts)
+
+def _sorted_posting_arrays(pl):
+    """
+    Convert a posting list into two parallel NumPy arrays sorted by doc_id.
+    
+    Args:
+        pl: List of (doc_id, term_frequency) tuples
+    
+    Returns:
+        Tuple (doc_ids, tfs) of int64 NumPy arrays
+    """
+    arr = np.array(pl, dtype=np.int64).reshape(-1, 2)
+    arr = arr[np.argsort(arr[:, 0], kind='stable')]
+    return arr[:, 0], arr[:, 1] & TF_MASK
+
+def _encode_posting_list_vbyte(doc_ids, tfs):
+    """
+    Encode a posting list as delta-gaps + VByte.
+    
+    Postings are stored as interleaved (doc_id - previous_doc_id, tf) pairs,
+    each VByte encoded.
+    
+    Args:
+        doc_ids: NumPy array of doc_ids, sorted ascending
+        tfs: NumPy array of term frequencies (same order as doc_ids)
+    
+    Returns:
+        Binary data (bytes)
+    """
+    values = np.empty(2 * len(doc_ids), dtype=np.int64)
+    values[0::2] = np.diff(doc_ids, prepend=0)  # doc_id gaps
+    values[1::2] = tfs
+    return _vbyte_encode(values)
+
+def _decode_posting_list_vbyte(b, offset=0):
+    """
+    Decode a posting list written by _encode_posting_list_vbyte().
+    
+    Args:
+        b: Binary data (bytes)
+        offset: Position in b where the encoded posting list starts
+    
+    Returns:
+        Tuple (doc_ids, tfs) of NumPy arrays (uint32, uint16)
+    """
+    values = _vbyte_decode(memoryview(b)[offset:])
+    n = len(values) // 2
+    doc_ids = np.cumsum(values[0:2 * n:2]).astype(np.uint32)
+    return doc_ids, values[1:2 * n:2].astype(np.uint16)
+
+# Roaring containers: doc_ids are grouped by their upper 16 bits. A group with
+# more than ROARING_ARRAY_MAX members is stored as a 2^16-bit bitset (8KB),
+# smaller groups as a sorted array of their lower 16 bits.
+ROARING_ARRAY_MAX = 4096
+ROARING_BITSET_BYTES = 2 ** 16 // 8
+
+def _encode_posting_list_roaring(doc_ids, tfs):
+    """
+    Encode a posting list as a Roaring bitmap of doc_ids plus VByte tfs.
+    
+    Layout (little-endian):
+    - number of containers (4 bytes)
+    - container keys, i.e. doc_id >> 16 (2 bytes each)
+    - container cardinalities (4 bytes each)
+    - container payloads (bitset or array of lower 16 bits)
+    - VByte encoded tfs, in doc_id order
+    
+    Args:
+        doc_ids: NumPy array of unique doc_ids, sorted ascending
+        tfs: NumPy array of term frequencies (same order as doc_ids)
+    
+    Returns:
+        Binary data (bytes)
+    """
+    keys, starts, cards = np.unique(doc_ids >> 16, return_index=True, return_counts=True)
+    b = [np.array([len(keys)], dtype='<u4').tobytes(),
+         keys.astype('<u2').tobytes(),
+         cards.astype('<u4').tobytes()]
+    for start, card in zip(starts.tolist(), cards.tolist()):
+        lows = doc_ids[start:start + card] & 0xFFFF
+        if card > ROARING_ARRAY_MAX:
+            bits = np.zeros(2 ** 16, dtype=bool)
+            bits[lows] = True
+            b.append(np.packbits(bits, bitorder='little').tobytes())
+        else:
+            b.append(lows.astype('<u2').tobytes())
+    b.append(_vbyte_encode(tfs))
+    return b''.join(b)
+
+def _decode_posting_list_roaring(b, offset=0):
+    """
+    Decode a posting list written by _encode_posting_list_roaring().
+    
+    Args:
+        b: Binary data (bytes)
+        offset: Position in b where the encoded posting list starts
+    
+    Returns:
+        Tuple (doc_ids, tfs) of NumPy arrays (uint32, uint16)
+    """
+    n = int(np.frombuffer(b, dtype='<u4', count=1, offset=offset)[0])
+    keys = np.frombuffer(b, dtype='<u2', count=n, offset=offset + 4)
+    cards = np.frombuffer(b, dtype='<u4', count=n, offset=offset + 4 + 2 * n)
+    pos = offset + 4 + 6 * n
+    doc_ids = []
+    for key, card in zip(keys.tolist(), cards.tolist()):
+        if card > ROARING_ARRAY_MAX:
+            bits = np.frombuffer(b, dtype=np.uint8, count=ROARING_BITSET_BYTES, offset=pos)
+            lows = np.flatnonzero(np.unpackbits(bits, bitorder='little'))
+            pos += ROARING_BITSET_BYTES
+        else:
+            lows = np.frombuffer(b, dtype='<u2', count=card, offset=pos)
+            pos += 2 * card
+        doc_ids.append(lows.astype(np.uint32) | np.uint32(key << 16))
+    doc_ids = np.concatenate(doc_ids) if doc_ids else np.empty(0, dtype=np.uint32)
+    tfs = _vbyte_decode(memoryview(b)[pos:])[:len(doc_ids)]
+    return doc_ids, tfs.astype(np.uint16)
+
+def _encode_posting_list_elias_fano(doc_ids, tfs):
+    """
+    Encode a posting list with Elias-Fano coded doc_ids plus VByte tfs.
+    
+    Each doc_id is split into L low bits, stored verbatim, and the remaining
+    high bits, stored in unary as a bitmap (bit high[i] + i is set). This
+    costs about 2 + log2(U / n) bits per doc_id, where U is the largest doc_id.
+    
+    Layout (little-endian):
+    - n, L and the upper bitmap size in bytes (4 bytes each)
+    - low bits, packed (ceil(n * L / 8) bytes)
+    - upper bitmap
+    - VByte encoded tfs, in doc_id order
+    
+    Args:
+        doc_ids: NumPy array of unique doc_ids, sorted ascending
+        tfs: NumPy array of term frequencies (same order as doc_ids)
+    
+    Returns:
+        Binary data (bytes)
+    """
+    n = len(doc_ids)
+    universe = int(doc_ids[-1]) + 1 if n else 1
+    n_low = max(0, int(np.floor(np.log2(universe / n)))) if n else 0
+    low = doc_ids & ((1 << n_low) - 1)
+    low_bits = (low[:, None] >> np.arange(n_low)) & 1
+    low_blob = np.packbits(low_bits.astype(np.uint8).ravel(), bitorder='little').tobytes()
+    high = doc_ids >> n_low
+    upper = np.zeros(int(high[-1]) + n if n else 0, dtype=bool)
+    upper[high + np.arange(n)] = True
+    upper_blob = np.packbits(upper, bitorder='little').tobytes()
+    header = np.array([n, n_low, len(upper_blob)], dtype='<u4').tobytes()
+    return b''.join([header, low_blob, upper_blob, _vbyte_encode(tfs)])
+
+def _decode_posting_list_elias_fano(b, offset=0):
+    """
+    Decode a posting list written by _encode_posting_list_elias_fano().
+    
+    Args:
+        b: Binary data (bytes)
+        offset: Position in b where the encoded posting list starts
+    
+    Returns:
+        Tuple (doc_ids, tfs) of NumPy arrays (uint32, uint16)
+    """
+    n, n_low, upper_nbytes = np.frombuffer(b, dtype='<u4', count=3, offset=offset).tolist()
+    pos = offset + 12
+    low_nbytes = (n * n_low + 7) // 8
+    low_bits = np.unpackbits(np.frombuffer(b, dtype=np.uint8, count=low_nbytes, offset=pos),
+                             count=n * n_low, bitorder='little').reshape(n, n_low)
+    low = (low_bits.astype(np.uint64) << np.arange(n_low, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+    pos += low_nbytes
+    upper = np.unpackbits(np.frombuffer(b, dtype=np.uint8, count=upper_nbytes, offset=pos),
+                          bitorder='little')
+    high = (np.flatnonzero(upper)[:n] - np.arange(n)).astype(np.uint64)
+    pos += upper_nbytes
+    doc_ids = (high << np.uint64(n_low)) | low
+    tfs = _vbyte_decode(memoryview(b)[pos:])[:n]
+    return doc_ids.astype(np.uint32), tfs.astype(np.uint16)
+
+# Compressed posting lists start with a 1-byte tag naming their format
+VBYTE_FORMAT = 1
+ROARING_FORMAT = 2
+ELIAS_FANO_FORMAT = 3
+_DECODERS = {
+    VBYTE_FORMAT: _decode_posting_list_vbyte,
+    ROARING_FORMAT: _decode_posting_list_roaring,
+    ELIAS_FANO_FORMAT: _decode_posting_list_elias_fano,
+}
+
+# Memory budget of each index's in-process cache of decoded posting lists
+POSTING_CACHE_BYTES = 256 * 2 ** 20
+# Fraction of the posting cache that warm_posting_cache() may fill up front
+WARM_CACHE_FRACTION = 0.5
+
+def _smallest_uint(values):
+    """Smallest unsigned NumPy dtype that holds every value of an array."""
+    top = int(values.max()) if len(values) else 0
+    for dtype in (np.uint8, np.uint16):
+        if top <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint32
+
+def _pack_cached_posting(doc_ids, tfs):
+    """
+    Compact, lossless form of a decoded posting list for the posting cache.
+    
+    Doc_ids are kept as the first doc_id plus the gaps between consecutive
+    doc_ids; the gaps and the tfs are each stored in the smallest unsigned
+    dtype that holds their largest value. Frequent terms have small gaps,
+    so their lists shrink from 6 to as little as 2 bytes per posting and
+    several times more lists fit in POSTING_CACHE_BYTES.
+    
+    Args:
+        doc_ids: NumPy uint32 array of doc_ids, sorted ascending
+        tfs: NumPy uint16 array of term frequencies
+    
+    Returns:
+        Tuple (first_doc_id, gaps, tfs)
+    """
+    first = int(doc_ids[0]) if len(doc_ids) else 0
+    gaps = np.diff(doc_ids)
+    return first, gaps.astype(_smallest_uint(gaps)), tfs.astype(_smallest_uint(tfs))
+
+def _unpack_cached_posting(packed):
+    """
+    Expand a cache entry written by _pack_cached_posting().
+    
+    Args:
+        packed: Tuple (first_doc_id, gaps, tfs)
+    
+    Returns:
+        Tuple (doc_ids, tfs) of uint32 / uint16 NumPy arrays
+    """
+    first, gaps, tfs = packed
+    doc_ids = np.empty(len(tfs), dtype=np.uint32)
+    if len(doc_ids):
+        doc_ids[0] = first
+        np.cumsum(gaps, dtype=np.uint32, out=doc_ids[1:])
+        doc_ids[1:] += np.uint32(first)
+    return doc_ids, tfs.astype(np.uint16)
+
+def _packed_nbytes(packed):
+    """Memory used by the arrays of a packed cache entry."""
+    return packed[1].nbytes + packed[2].nbytes
+
+# Lists whose doc_ids fill more than this fraction of their range (doc_ids[-1] + 1)
+# are also tried as Roaring bitmaps
+ROARING_MIN_DENSITY = 0.2
+# Lists denser than this are also tried with Elias-Fano
+ELIAS_FANO_MIN_DENSITY = 0.001
+
+def _encode_posting_list_compressed(doc_ids, tfs):
+    """
+    Encode a posting list with the smallest format suited to its density.
+    
+    Density is measured against the doc_id range (doc_ids[-1] + 1), not the
+    number of documents, since doc_ids are sparse Wikipedia page ids.
+    Delta + VByte is always a candidate; mid-density lists are also encoded
+    with Elias-Fano and dense (stopword-like) ones as a Roaring bitmap, and
+    the smallest encoding is kept. The chosen format is written as a 1-byte
+    tag before the payload.
+    
+    Args:
+        doc_ids: NumPy array of doc_ids, sorted ascending
+        tfs: NumPy array of term frequencies (same order as doc_ids)
+    
+    Returns:
+        Binary data (bytes)
+    """
+    best = bytes([VBYTE_FORMAT]) + _encode_posting_list_vbyte(doc_ids, tfs)
+    density = len(doc_ids) / (int(doc_ids[-1]) + 1) if len(doc_ids) > 0 else 0.0
+    candidates = []
+    if density > ELIAS_FANO_MIN_DENSITY:
+        candidates.append((ELIAS_FANO_FORMAT, _encode_posting_list_elias_fano))
+    if density > ROARING_MIN_DENSITY:
+        candidates.append((ROARING_FORMAT, _encode_posting_list_roaring))
+    for fmt, encode in candidates:
+        b = bytes([fmt]) + encode(doc_ids, tfs)
+        if len(b) < len(best):
+            best = b
+    return best
+
+def _decode_posting_list_compressed(b):
+    """
+    Decode a posting list written by _encode_posting_list_compressed(),
+    dispatching on its format tag.
+    
+    Args:
+        b: Binary data (bytes)
+    
+    Returns:
+        Tuple (doc_ids, tfs) of NumPy arrays (uint32, uint16)
+    """
+    if len(b) == 0:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16)
+    return _DECODERS[b[0]](b, 1)
+
+# Number of postings converted to Python tuples at a time by iter_posting
+ITER_BATCH = 4096
+
+# Documents with at most this many tokens are counted with a plain dict loop in add_doc
+SHORT_DOC_TOKENS = 32
+
+# Live InvertedIndex instances, reset by a single fork hook (see _reset_indices_after_fork)
+_LIVE_INDICES = weakref.WeakSet()
+
+def _reset_indices_after_fork():
+    """Call _reset_after_fork() on every live index in a forked child process."""
+    for index in list(_LIVE_INDICES):
+        index._reset_after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_indices_after_fork)
 
 class InvertedIndex:
     """
@@ -202,12 +827,18 @@ class InvertedIndex:
     Key attributes:
     - df: Document frequency (number of documents containing each term)
     - term_total: Total occurrences of each term across all documents
-    - _posting_list: In-memory posting lists (used during construction, not saved)
+    - _doc_ids, _tfs: In-memory posting lists as parallel arrays per term
+      (used during construction, not saved)
     - posting_locs: File locations of posting lists (for retrieval)
+    - _posting_cache: LRU cache of decoded posting lists (query time, not saved)
+    - _readers: Long-lived MultiFileReaders reused across queries (not saved)
     
     Binary encoding:
-    - Each posting is 6 bytes: 4 bytes doc_id + 2 bytes term_frequency
-    - Doc_id is shifted left 16 bits, term_frequency is in lower 16 bits
+    - Posting lists are sorted by doc_id and stored as VByte-encoded
+      (doc_id gap, term_frequency) pairs, or as Roaring bitmaps / Elias-Fano
+      for frequent terms; their locations are (filename, offset, nbytes) tuples
+    - Older indices use a fixed 6 bytes per posting (4 bytes doc_id +
+      2 bytes term_frequency) with (filename, offset) locations; both are read
     """
     
     def __init__(self, docs={}):
@@ -219,8 +850,12 @@ class InvertedIndex:
         """
         self.df = Counter()  # Document frequency for each term
         self.term_total = Counter()  # Total occurrences of each term
-        self._posting_list = defaultdict(list)  # In-memory posting lists
+        # In-memory posting lists, stored as struct-of-arrays: term -> array of doc_ids
+        # and term -> array of tfs (4 + 2 bytes per posting instead of a tuple object)
+        self._doc_ids = defaultdict(partial(array, 'I'))
+        self._tfs = defaultdict(partial(array, 'H'))
         self.posting_locs = defaultdict(list)  # File locations of posting lists
+        self._init_posting_cache()
 
         # Build index from provided documents
         for doc_id, tokens in docs.items():
@@ -239,19 +874,30 @@ class InvertedIndex:
             doc_id: Unique document identifier
             tokens: List of terms/tokens in the document
         """
-        w2cnt = Counter(tokens)  # Count occurrences of each term
+        # Count occurrences of each term. Counter's C counting loop wins on long
+        # documents, but its setup cost dominates for short ones (titles, anchors)
+        if len(tokens) <= SHORT_DOC_TOKENS:
+            w2cnt = {}
+            get = w2cnt.get
+            for t in tokens:
+                w2cnt[t] = get(t, 0) + 1
+        else:
+            w2cnt = Counter(tokens)
         self.term_total.update(w2cnt)  # Update total counts
+        self.df.update(w2cnt.keys())  # Each distinct term adds 1 to its document frequency
         
         # Add document to posting list of each term
+        doc_ids, tfs = self._doc_ids, self._tfs
         for w, cnt in w2cnt.items():
-            self.df[w] = self.df.get(w, 0) + 1  # Increment document frequency
-            self._posting_list[w].append((doc_id, cnt))  # Add to posting list
+            doc_ids[w].append(doc_id)  # Add to posting list
+            tfs[w].append(cnt & TF_MASK)
 
     def write_index(self, base_dir, name, bucket_name=None):
         """
         Write the inverted index to storage.
         Currently only writes metadata (df, term_total, posting_locs).
-        Posting lists are written separately using write_a_posting_list().
+        Posting lists are written separately using write_a_posting_list()
+        or write_posting_lists().
         
         Args:
             base_dir: Directory path for output
@@ -262,8 +908,8 @@ class InvertedIndex:
 
     def _write_globals(self, base_dir, name, bucket_name):
         """
-        Write the index metadata to a pickle file.
-        Uses __getstate__ to exclude _posting_list (too large for memory).
+        Write the index metadata to a pickle file (highest pickle protocol).
+        Uses __getstate__ to exclude the in-memory posting lists (too large for memory).
         
         Args:
             base_dir: Directory path for output
@@ -273,30 +919,144 @@ class InvertedIndex:
         path = str(Path(base_dir) / f'{name}.pkl')
         bucket = None if bucket_name is None else get_bucket(bucket_name)
         with _open(path, 'wb', bucket) as f:
-            pickle.dump(self, f)
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _init_posting_cache(self):
+        """Create the (empty) LRU cache of decoded posting lists and of open readers."""
+        self._posting_cache = OrderedDict()  # (base_dir, term, bucket_name) -> packed (first, gaps, tfs)
+        self._posting_cache_bytes = 0
+        self._posting_cache_lock = threading.Lock()  # Queries may run in several threads
+        self._readers = {}  # (base_dir, bucket_name) -> MultiFileReader
+        _LIVE_INDICES.add(self)  # Reset by the module-level fork hook
+
+    def _reset_after_fork(self):
+        """
+        Make the index usable in a forked child process.
+        
+        The decoded posting cache is kept (its pages are shared copy-on-write
+        with the parent), but the lock and the open readers (file handles, GCS
+        connections and reader threads) belong to the parent and are replaced.
+        """
+        self._posting_cache_lock = threading.Lock()
+        self._readers = {}
+
+    def open_reader(self, base_dir, bucket_name=None):
+        """
+        Get a long-lived reader for the posting files of this index.
+        
+        The reader is created once per (base_dir, bucket_name) and kept on the
+        instance, so its open file handles and GCS bucket connection are
+        reused by every following query instead of being set up per lookup.
+        
+        Args:
+            base_dir: Directory containing the posting list files
+            bucket_name: Optional GCS bucket name
+        
+        Returns:
+            MultiFileReader shared by all callers
+        """
+        key = (base_dir, bucket_name)
+        with self._posting_cache_lock:
+            if key not in self._readers:
+                self._readers[key] = MultiFileReader(base_dir, bucket_name)
+            return self._readers[key]
+
+    def _cache_posting(self, key, posting):
+        """
+        Insert a decoded posting list into the LRU cache (in the packed form of
+        _pack_cached_posting()), evicting the least recently used entries once
+        POSTING_CACHE_BYTES is exceeded.
+        
+        Args:
+            key: Cache key (base_dir, term, bucket_name)
+            posting: Tuple (doc_ids, tfs) of NumPy arrays
+        """
+        packed = _pack_cached_posting(*posting)
+        nbytes = _packed_nbytes(packed)
+        if nbytes > POSTING_CACHE_BYTES:
+            return
+        with self._posting_cache_lock:
+            if key in self._posting_cache:
+                return
+            self._posting_cache[key] = packed
+            self._posting_cache_bytes += nbytes
+            while self._posting_cache_bytes > POSTING_CACHE_BYTES:
+                _, evicted = self._posting_cache.popitem(last=False)
+                self._posting_cache_bytes -= _packed_nbytes(evicted)
+
+    def _cached_posting(self, key):
+        """
+        Look up a posting list in the LRU cache and mark it as most recently used.
+        
+        Args:
+            key: Cache key (base_dir, term, bucket_name)
+        
+        Returns:
+            Tuple (doc_ids, tfs) of NumPy arrays, or None if the list is not cached
+        """
+        with self._posting_cache_lock:
+            packed = self._posting_cache.get(key)
+            if packed is None:
+                return None
+            self._posting_cache.move_to_end(key)
+        return _unpack_cached_posting(packed)
 
     def __getstate__(self):
         """
         Control what gets pickled when saving the index.
-        Excludes _posting_list to save memory (posting lists are stored in binary files).
+        Excludes the in-memory posting lists (_doc_ids, _tfs) to save memory
+        (posting lists are stored in binary files) and the query-time posting cache.
         Only saves metadata: df, term_total, posting_locs.
         
         Returns:
-            Dictionary of attributes to pickle (without _posting_list)
+            Dictionary of attributes to pickle (without in-memory posting lists)
         """
         state = self.__dict__.copy()
-        del state['_posting_list']  # Don't save in-memory posting lists
+        # Don't save in-memory posting lists or cached decoded ones
+        for attr in ('_posting_list', '_doc_ids', '_tfs', '_posting_cache',
+                     '_posting_cache_bytes', '_posting_cache_lock', '_readers'):
+            state.pop(attr, None)
         return state
 
+    def __setstate__(self, state):
+        """
+        Restore a pickled index and give it an empty posting cache.
+        
+        Args:
+            state: Dictionary of attributes produced by __getstate__
+        """
+        self.__dict__.update(state)
+        self._init_posting_cache()
+
+    def _posting_nbytes(self, w, locs):
+        """
+        Number of bytes occupied by a term's posting list on disk.
+        
+        Compressed posting lists record the size of each chunk in their
+        locations; fixed-size ones are df[w] * TUPLE_SIZE bytes.
+        """
+        if len(locs[0]) == 3:
+            return sum(nbytes for _, _, nbytes in locs)
+        return self.df[w] * TUPLE_SIZE
+
+    @staticmethod
+    def _decode(b, locs):
+        """Decode posting list bytes with the codec matching its locations."""
+        if len(locs[0]) == 3:
+            return _decode_posting_list_compressed(b)
+        return _decode_posting_list(b)
+
     def posting_lists_iter(self, base_dir, bucket_name=None):
         """
         Iterator over all posting lists in the index.
         Reads binary data from files and decodes it into (doc_id, tf) pairs.
+        The next term's bytes are fetched in the background while the current
+        posting list is decoded and consumed.
         
         Binary decoding:
-        - Each entry is 6 bytes
-        - First 4 bytes: doc_id (big-endian integer)
-        - Next 2 bytes: term_frequency (big-endian integer)
+        - Compressed lists: format tag, then VByte (doc_id gap, tf) pairs,
+          a Roaring bitmap or Elias-Fano coded doc_ids
+        - Older lists: 6 bytes per entry, 4 bytes doc_id + 2 bytes tf (big-endian)
         
         Args:
             base_dir: Directory containing the posting list files
@@ -305,20 +1065,224 @@ class InvertedIndex:
         Yields:
             Tuples of (term, posting_list) where posting_list is [(doc_id, tf), ...]
         """
-        with closing(MultiFileReader(base_dir, bucket_name)) as reader:
-            for w, locs in self.posting_locs.items():
-                # Read binary data for this term's posting list
-                b = reader.read(locs, self.df[w] * TUPLE_SIZE)
-                posting_list = []
+        df = self.df
+        terms = [(w, locs) for w, locs in self.posting_locs.items() if locs]
+        
+        def read_term(w, locs):
+            # Read binary data for this term's posting list (format is known from locs)
+            if len(locs[0]) == 3:
+                return reader.read(locs, sum(nbytes for _, _, nbytes in locs))
+            return reader.read(locs, df[w] * TUPLE_SIZE)
+        
+        with closing(MultiFileReader(base_dir, bucket_name)) as reader, \
+             ThreadPoolExecutor(max_workers=1) as prefetcher:
+            future = prefetcher.submit(read_term, *terms[0]) if terms else None
+            for i, (w, locs) in enumerate(terms):
+                b = future.result()
+                # Prefetch the next term's bytes while this one is decoded and consumed
+                if i + 1 < len(terms):
+                    future = prefetcher.submit(read_term, *terms[i + 1])
                 
-                # Decode each (doc_id, tf) pair
-                for i in range(self.df[w]):
-                    doc_id = int.from_bytes(b[i*TUPLE_SIZE:i*TUPLE_SIZE+4], 'big')
-                    tf = int.from_bytes(b[i*TUPLE_SIZE+4:(i+1)*TUPLE_SIZE], 'big')
-                    posting_list.append((doc_id, tf))
+                if len(locs[0]) == 3:
+                    doc_ids, tfs = _decode_posting_list_compressed(b)
+                    posting_list = list(zip(doc_ids.tolist(), tfs.tolist()))
+                else:
+                    # Fixed-size entries unpack directly into tuples in C (ignoring a partial tail)
+                    posting_list = list(POSTING_STRUCT.iter_unpack(
+                        memoryview(b)[:len(b) - len(b) % TUPLE_SIZE]))
                 
                 yield w, posting_list
 
+    def read_a_posting_array(self, base_dir, w, bucket_name=None):
+        """
+        Read the posting list for a specific term as two parallel NumPy arrays.
+        
+        Preferred over read_a_posting_list() when the caller does vectorized
+        scoring, since no per-posting Python tuples are created.
+        Decoded lists are kept in a compact LRU cache, so repeated lookups of
+        popular terms skip the read and decode and only expand the cached
+        doc_id gaps.
+        
+        Args:
+            base_dir: Directory containing the posting list files
+            w: Term to look up
+            bucket_name: Optional GCS bucket name (CRITICAL: must be passed to reader)
+        
+        Returns:
+            Tuple (doc_ids, tfs) of NumPy arrays, sorted by doc_id
+            Returns two empty arrays if term not found
+        """
+        locs = self.posting_locs.get(w)  # One lookup; never inserts into the defaultdict
+        if not locs:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16)
+        
+        key = (base_dir, w, bucket_name)
+        posting = self._cached_posting(key)
+        if posting is not None:
+            return posting
+        
+        # CRITICAL FIX: Pass bucket_name to MultiFileReader for GCS access
+        reader = self.open_reader(base_dir, bucket_name)
+        b = reader.read(locs, self._posting_nbytes(w, locs))
+        posting = self._decode(b, locs)
+        self._cache_posting(key, posting)
+        return posting
+
+    def iter_posting(self, base_dir, w, bucket_name=None):
+        """
+        Stream the postings of a term as (doc_id, tf) tuples.
+        
+        Meant for callers that may stop early; callers that consume whole
+        lists should use read_a_posting_array() / read_posting_arrays().
+        Fixed-width posting lists are read one file chunk (at most BLOCK_SIZE
+        bytes) at a time, so memory stays bounded by one chunk and a caller
+        that stops early never reads the rest. Compressed lists need their
+        whole payload to decode; they are added to the posting cache and
+        (like cached lists) yielded in batches rather than converted to one
+        big list.
+        
+        Args:
+            base_dir: Directory containing the posting list files
+            w: Term to look up
+            bucket_name: Optional GCS bucket name
+        
+        Yields:
+            (doc_id, term_frequency) tuples, sorted by doc_id
+        """
+        locs = self.posting_locs.get(w)
+        if not locs:
+            return
+        
+        key = (base_dir, w, bucket_name)
+        posting = self._cached_posting(key)
+        reader = self.open_reader(base_dir, bucket_name)
+        if posting is None and len(locs[0]) == 3:
+            b = reader.read(locs, sum(nbytes for _, _, nbytes in locs))
+            posting = _decode_posting_list_compressed(b)
+            self._cache_posting(key, posting)
+        if posting is not None:
+            doc_ids, tfs = posting
+            for start in range(0, len(doc_ids), ITER_BATCH):
+                end = start + ITER_BATCH
+                yield from zip(doc_ids[start:end].tolist(), tfs[start:end].tolist())
+            return
+        
+        n_bytes = self.df[w] * TUPLE_SIZE
+        tail = b''  # Partial posting left over at the end of the previous chunk
+        for loc in locs:
+            n_read = min(n_bytes, BLOCK_SIZE - loc[1])
+            chunk = tail + reader.read([loc], n_read)
+            n_bytes -= n_read
+            usable = len(chunk) - len(chunk) % TUPLE_SIZE
+            yield from POSTING_STRUCT.iter_unpack(memoryview(chunk)[:usable])
+            tail = chunk[usable:]
+
+    def submit_posting_reads(self, base_dir, words, bucket_name=None):
+        """
+        Start reading the posting lists of several terms on the shared
+        term-read pool (see _term_read_pool), without waiting for them.
+        
+        Args:
+            base_dir: Directory containing the posting list files
+            words: Iterable of terms (duplicates are read once)
+            bucket_name: Optional GCS bucket name
+        
+        Returns:
+            Dictionary mapping term -> Future of its (doc_ids, tfs) NumPy arrays
+        """
+        pool = _term_read_pool()
+        return {w: pool.submit(self.read_a_posting_array, base_dir, w, bucket_name)
+                for w in dict.fromkeys(words)}
+
+    def read_posting_arrays(self, base_dir, words, bucket_name=None):
+        """
+        Read the posting lists of several terms concurrently.
+        
+        Each term is fetched by read_a_posting_array() on a thread of the
+        shared term-read pool, so the GCS round trips of a multi-term query
+        overlap instead of adding up.
+        
+        Args:
+            base_dir: Directory containing the posting list files
+            words: Iterable of terms (duplicates are read once)
+            bucket_name: Optional GCS bucket name
+        
+        Returns:
+            Dictionary mapping term -> (doc_ids, tfs) NumPy arrays
+        """
+        words = list(dict.fromkeys(words))  # Unique terms, in query order
+        if len(words) <= 1:
+            return {w: self.read_a_posting_array(base_dir, w, bucket_name) for w in words}
+        futures = self.submit_posting_reads(base_dir, words, bucket_name)
+        return {w: f.result() for w, f in futures.items()}
+
+    def warm_posting_cache(self, base_dir, n_terms, bucket_name=None, term_filter=None):
+        """
+        Pre-load the posting lists of the most frequent terms into the cache.
+        
+        Frequent terms are the ones queries hit most, so loading them once at
+        startup keeps those lookups from ever reaching the posting files.
+        Instead of one ranged GET per term, the hot terms are grouped by the
+        posting file they live in: each file is downloaded once (the span
+        from its first to its last hot posting list) and the lists are sliced
+        out locally. Files are read READ_WORKERS at a time, hottest first,
+        until the cache holds WARM_CACHE_FRACTION of POSTING_CACHE_BYTES,
+        leaving the rest of the cache for other terms.
+        
+        Args:
+            base_dir: Directory containing the posting list files
+            n_terms: Maximum number of terms to load
+            bucket_name: Optional GCS bucket name
+            term_filter: Optional predicate; only terms for which it returns
+                True are loaded (e.g. to skip terms queries never score)
+        
+        Returns:
+            List of the terms that were loaded
+        """
+        df = self.df
+        budget = POSTING_CACHE_BYTES * WARM_CACHE_FRACTION
+        candidates = (w for w, locs in self.posting_locs.items()
+                      if locs and (term_filter is None or term_filter(w)))
+        terms = heapq.nlargest(n_terms, candidates, key=lambda w: df.get(w, 0))
+        reader = self.open_reader(base_dir, bucket_name)
+        term_ranges = [reader.ranges(self.posting_locs[w], self._posting_nbytes(w, self.posting_locs[w]))
+                       for w in terms]
+        
+        # Byte span of the hot lists in each file, files ordered by their hottest term
+        spans = {}  # file -> [start, end)
+        n_users = Counter()  # file -> number of hot terms still to be sliced from it
+        for ranges in term_ranges:
+            for f, offset, n_read in ranges:
+                span = spans.setdefault(f, [offset, offset + n_read])
+                span[0], span[1] = min(span[0], offset), max(span[1], offset + n_read)
+                n_users[f] += 1
+        files = list(spans)
+        
+        buffers = {}  # file -> (span start, downloaded bytes)
+        loaded = []
+        for start in range(0, len(files), READ_WORKERS):
+            if self._posting_cache_bytes >= budget:
+                break
+            batch = files[start:start + READ_WORKERS]
+            data = reader.read_ranges([(f, spans[f][0], spans[f][1] - spans[f][0]) for f in batch])
+            buffers.update((f, (spans[f][0], b)) for f, b in zip(batch, data))
+            # A term's files all come no later than the files of less frequent terms,
+            # so terms become complete in df order
+            while len(loaded) < len(terms) and self._posting_cache_bytes < budget:
+                i = len(loaded)
+                if not all(f in buffers for f, _, _ in term_ranges[i]):
+                    break
+                b = b"".join(buffers[f][1][offset - buffers[f][0]:offset - buffers[f][0] + n_read]
+                             for f, offset, n_read in term_ranges[i])
+                w = terms[i]
+                self._cache_posting((base_dir, w, bucket_name), self._decode(b, self.posting_locs[w]))
+                loaded.append(w)
+                for f, _, _ in term_ranges[i]:
+                    n_users[f] -= 1
+                    if n_users[f] == 0:
+                        del buffers[f]  # Free each download once all its lists are cached
+        return loaded
+
     def read_a_posting_list(self, base_dir, w, bucket_name=None):
         """
         Read the posting list for a specific term.
@@ -326,8 +1290,7 @@ class InvertedIndex:
         This is the primary method for query processing - retrieves all documents
         containing a given term along with their term frequencies.
         
-        Binary decoding:
-        - Each entry is 6 bytes: 4 bytes doc_id + 2 bytes term_frequency
+        Binary decoding: see posting_lists_iter()
         
         Args:
             base_dir: Directory containing the posting list files
@@ -338,22 +1301,8 @@ class InvertedIndex:
             List of (doc_id, term_frequency) tuples, sorted by doc_id
             Returns empty list if term not found
         """
-        posting_list = []
-        if not w in self.posting_locs:
-            return posting_list
-        
-        # CRITICAL FIX: Pass bucket_name to MultiFileReader for GCS access
-        with closing(MultiFileReader(base_dir, bucket_name)) as reader:
-            locs = self.posting_locs[w]
-            b = reader.read(locs, self.df[w] * TUPLE_SIZE)
-            
-            # Decode binary data into (doc_id, tf) pairs
-            for i in range(self.df[w]):
-                doc_id = int.from_bytes(b[i*TUPLE_SIZE:i*TUPLE_SIZE+4], 'big')
-                tf = int.from_bytes(b[i*TUPLE_SIZE+4:(i+1)*TUPLE_SIZE], 'big')
-                posting_list.append((doc_id, tf))
-        
-        return posting_list
+        doc_ids, tfs = self.read_a_posting_array(base_dir, w, bucket_name)
+        return list(zip(doc_ids.tolist(), tfs.tolist()))
 
     @staticmethod
     def write_a_posting_list(b_w_pl, base_dir, bucket_name=None):
@@ -361,9 +1310,16 @@ class InvertedIndex:
         Write posting lists to binary files (static method for parallel processing).
         
         Binary encoding:
-        - Each (doc_id, tf) pair is encoded as 6 bytes
-        - doc_id is shifted left 16 bits, tf occupies lower 16 bits
-        - Format: (doc_id << 16 | tf).to_bytes(6, 'big')
+        - A 1-byte format tag, followed by the encoded postings
+        - Default: postings sorted by doc_id and delta-encoded (gap to previous doc_id),
+          each (gap, tf) pair VByte encoded: 7 bits per byte, high bit ends a value
+        - Density is df / (largest doc_id + 1); the smallest candidate format is kept
+        - Mid-density terms (density > ELIAS_FANO_MIN_DENSITY) also try Elias-Fano
+          coded doc_ids followed by the VByte encoded tfs
+        - Dense terms (density > ROARING_MIN_DENSITY) also try a Roaring bitmap of
+          doc_ids followed by the VByte encoded tfs
+        - Locations are stored as (filename, offset, nbytes) so readers know the
+          exact compressed size of every chunk
         
         Also saves a separate pickle file with the posting locations
         ({bucket_id}_posting_locs.pickle) for later retrieval.
@@ -376,25 +1332,74 @@ class InvertedIndex:
         Returns:
             bucket_id (for tracking completion)
         """
-        posting_locs = defaultdict(list)
         bucket_id, list_w_pl = b_w_pl
+        items = ((w, *_sorted_posting_arrays(pl)) for w, pl in list_w_pl)
+        InvertedIndex._write_posting_arrays(items, base_dir, bucket_id, bucket_name)
+        return bucket_id
+
+    def write_posting_lists(self, base_dir, bucket_id, bucket_name=None):
+        """
+        Write the in-memory posting lists built with add_doc() to binary files.
+        
+        Same output as write_a_posting_list(), but the struct-of-arrays
+        postings are handed to the encoder as NumPy views, without building
+        (doc_id, tf) tuples. The resulting locations are also stored in
+        self.posting_locs.
+        
+        Args:
+            base_dir: Directory for output files
+            bucket_id: Name prefix of the output files
+            bucket_name: Optional GCS bucket name
+        
+        Returns:
+            bucket_id (for tracking completion)
+        """
+        def items():
+            for w, doc_ids in self._doc_ids.items():
+                doc_ids = np.frombuffer(doc_ids, dtype=np.uint32).astype(np.int64)
+                tfs = np.frombuffer(self._tfs[w], dtype=np.uint16).astype(np.int64)
+                order = np.argsort(doc_ids, kind='stable')
+                yield w, doc_ids[order], tfs[order]
+        
+        posting_locs = InvertedIndex._write_posting_arrays(items(), base_dir, bucket_id, bucket_name)
+        self.posting_locs.update(posting_locs)
+        return bucket_id
+
+    @staticmethod
+    def _write_posting_arrays(items, base_dir, bucket_id, bucket_name=None):
+        """
+        Encode and write posting lists given as sorted NumPy arrays, then save
+        their locations to {bucket_id}_posting_locs.pickle.
+        
+        Args:
+            items: Iterable of (term, doc_ids, tfs), doc_ids sorted ascending
+            base_dir: Directory for output files
+            bucket_id: Name prefix of the output files
+            bucket_name: Optional GCS bucket name
+        
+        Returns:
+            Dictionary mapping term -> list of (filename, offset, nbytes)
+        """
+        posting_locs = defaultdict(list)
         
         with closing(MultiFileWriter(base_dir, bucket_id, bucket_name)) as writer:
             # Encode and write each posting list
-            for w, pl in list_w_pl:
-                # Encode: doc_id in upper 4 bytes, tf in lower 2 bytes
-                b = b''.join([(doc_id << 16 | (tf & TF_MASK)).to_bytes(TUPLE_SIZE, 'big')
-                              for doc_id, tf in pl])
-                locs = writer.write(b)
-                posting_locs[w].extend(locs)
+            for w, doc_ids, tfs in items:
+                b = _encode_posting_list_compressed(doc_ids, tfs)
+                n_left = len(b)
+                # Attach the size of each chunk (a chunk ends at BLOCK_SIZE or at the end of b)
+                for f_name, pos in writer.write(b):
+                    n_chunk = min(n_left, BLOCK_SIZE - pos)
+                    posting_locs[w].append((f_name, pos, n_chunk))
+                    n_left -= n_chunk
             
             # Save the posting locations for later retrieval
             path = str(Path(base_dir) / f'{bucket_id}_posting_locs.pickle')
             bucket = None if bucket_name is None else get_bucket(bucket_name)
             with _open(path, 'wb', bucket) as f:
-                pickle.dump(posting_locs, f)
+                pickle.dump(posting_locs, f, protocol=pickle.HIGHEST_PROTOCOL)
         
-        return bucket_id
+        return posting_locs
 
     @staticmethod
     def read_index(base_dir, name, bucket_name=None):
@@ -60,8 +60,13 @@ gcloud compute ssh $GOOGLE_ACCOUNT_NAME@$INSTANCE_NAME --zone $ZONE
 # print("pandas:", pandas.__version__)
 # PY
 
-# 7. Run the server
-nohup ~/venv/bin/python ~/search_frontend.py > ~/frontend.log 2>&1 &
+# 7. Run the server. With --preload and PRELOAD=1 the indices and metadata are
+# loaded once before the workers fork, so no request pays the cold start.
+# Each worker serves 8 requests concurrently on threads (gthread), so the GCS
+# reads of concurrent queries overlap instead of queueing behind each other.
+# (For a quick single-process run: nohup ~/venv/bin/python ~/search_frontend.py > ~/frontend.log 2>&1 &)
+cd ~ && PRELOAD=1 nohup ~/venv/bin/gunicorn --preload --workers 2 --worker-class gthread --threads 8 \
+  --bind 0.0.0.0:8080 search_frontend:app > ~/frontend.log 2>&1 &
 
 # 8. Start querying
 curl "http://127.0.0.1:8080/search?query=hello"
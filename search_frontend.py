@@ -4,9 +4,295 @@
 
 from flask import Flask, request, jsonify
 from collections import Counter
-import os, re, pickle, math
-from google.cloud import storage
-from inverted_index_gcp import InvertedIndex
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import os, re, pickle, math, threading, gc, weakref
+import numpy as np
+from inverted_index_gcp import InvertedIndex, get_client
+try:
+    import orjson
+except ImportError:  # orjson is optional, responses are then encoded by Flask's jsonify
+    orjson = None
+
+# Number of concurrent GCS downloads when loading metadata and posting locations
+DOWNLOAD_WORKERS = 8
+# Download chunk size for large GCS objects
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Number of most frequent terms per index whose posting lists are pre-loaded at startup
+# (downloaded with one ranged GET per posting file, see InvertedIndex.warm_posting_cache)
+HOT_TERMS = 50000
+# Body terms with a lower IDF (found in more than ~30% of documents) add almost
+# nothing to a score but have the longest posting lists, so they are skipped
+MIN_BODY_IDF = 0.5
+# Maximum number of body postings scored per query; terms are taken rarest first
+BODY_POSTINGS_BUDGET = 3000000
+# Queries with fewer postings than this are merged in full, without MaxScore pruning
+MAXSCORE_MIN_POSTINGS = 100000
+
+# Number of values converted at a time when writing the reciprocal document norms
+RECIPROCAL_CHUNK = 1 << 20
+
+# Number of pickle loads currently running with the garbage collector paused
+_gc_pauses = 0
+_gc_pause_lock = threading.Lock()
+
+def _load_pickle(f):
+    """
+    pickle.load() with the cyclic garbage collector paused.
+    
+    Unpickling the large index and posting-location dictionaries creates
+    millions of tuples and lists, which otherwise trigger repeated
+    collections that rescan everything loaded so far (~3x slower).
+    Loads may run concurrently, so the collector is re-enabled only when
+    the last one finishes.
+    
+    Args:
+        f: Binary file object to read from
+    
+    Returns:
+        The unpickled Python object
+    """
+    global _gc_pauses
+    with _gc_pause_lock:
+        if _gc_pauses == 0:
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        return pickle.load(f)
+    finally:
+        with _gc_pause_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0:
+                gc.enable()
+
+class DocValues:
+    """
+    Read-only mapping doc_id -> numeric value backed by two NumPy arrays
+    (sorted doc_ids and their values).
+    
+    Supports dict-style get() for single lookups and get_many() to look up
+    a whole array of doc_ids in one vectorized binary search.
+    """
+    
+    # Files written by save(), appended to the path prefix
+    SUFFIXES = ('_ids.npy', '_values.npy')
+
+    def __init__(self, ids, values):
+        """
+        Args:
+            ids: NumPy array of doc_ids, sorted ascending
+            values: NumPy array of values (same order as ids)
+        """
+        self.ids = ids
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, d, dtype=np.float64):
+        """
+        Build from a dictionary mapping doc_id -> value.
+        
+        Args:
+            d: Dictionary mapping doc_id -> value
+            dtype: NumPy dtype of the values
+        
+        Returns:
+            DocValues object
+        """
+        ids = np.fromiter(d.keys(), dtype=np.int64, count=len(d))
+        values = np.fromiter(d.values(), dtype=dtype, count=len(d))
+        order = np.argsort(ids)
+        return cls(ids[order], values[order])
+
+    def save(self, prefix):
+        """
+        Write the arrays as <prefix>_ids.npy and <prefix>_values.npy.
+        
+        Args:
+            prefix: Path prefix of the two .npy files
+        """
+        np.save(prefix + '_ids.npy', self.ids)
+        np.save(prefix + '_values.npy', self.values)
+
+    @classmethod
+    def load(cls, prefix):
+        """
+        Open arrays written by save() as read-only memory maps, so pages are
+        only read from disk when they are looked up.
+        
+        Args:
+            prefix: Path prefix of the two .npy files
+        
+        Returns:
+            DocValues object
+        """
+        return cls(np.load(prefix + '_ids.npy', mmap_mode='r'),
+                   np.load(prefix + '_values.npy', mmap_mode='r'))
+
+    def reciprocal(self, path):
+        """
+        DocValues holding 1 / value for every doc_id (0 where the value is 0),
+        so callers can multiply instead of divide.
+        
+        The reciprocals are written once to their own .npy file, chunk by
+        chunk, and opened as a read-only memory map like the table itself,
+        so no in-memory copy of the whole table is made. The file is rebuilt
+        if it is missing or does not match this table.
+        
+        Args:
+            path: Path of the .npy file holding the reciprocals
+        
+        Returns:
+            DocValues object with the same doc_ids
+        """
+        n = len(self.values)
+        source = getattr(self.values, 'filename', None)  # Set when the values are memory-mapped
+        if not os.path.exists(path) or np.load(path, mmap_mode='r').shape != (n,) \
+                or (source and os.path.getmtime(path) < os.path.getmtime(source)):
+            tmp = path + '.tmp'
+            out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64, shape=(n,))  # Zero-filled
+            for start in range(0, n, RECIPROCAL_CHUNK):
+                chunk = self.values[start:start + RECIPROCAL_CHUNK]
+                np.divide(1.0, chunk, out=out[start:start + RECIPROCAL_CHUNK], where=chunk != 0)
+            out.flush()
+            del out
+            os.replace(tmp, path)
+        return DocValues(self.ids, np.load(path, mmap_mode='r'))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_many(self, doc_ids, default=0):
+        """
+        Look up the values of many doc_ids at once.
+        
+        Args:
+            doc_ids: NumPy array of doc_ids
+            default: Value for doc_ids that are not present
+        
+        Returns:
+            NumPy array of values (same order as doc_ids)
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(len(doc_ids), default, dtype=self.values.dtype)
+        pos = np.minimum(np.searchsorted(self.ids, doc_ids), len(self.ids) - 1)
+        return np.where(self.ids[pos] == doc_ids, self.values[pos], default)
+
+    def get(self, doc_id, default=None):
+        """Look up a single doc_id, like dict.get()."""
+        pos = int(np.searchsorted(self.ids, doc_id))
+        if pos < len(self.ids) and self.ids[pos] == doc_id:
+            return self.values[pos].item()
+        return default
+
+class DocTitles:
+    """
+    Read-only mapping doc_id -> article title stored without per-title
+    Python objects: sorted doc_ids, one UTF-8 byte array with all titles
+    concatenated, and offsets into it (title i is chars[offsets[i]:offsets[i+1]]).
+    
+    Titles are decoded only for the documents that are looked up.
+    """
+    
+    # Files written by save(), appended to the path prefix
+    SUFFIXES = ('_ids.npy', '_offsets.npy', '_chars.npy')
+
+    def __init__(self, ids, offsets, chars):
+        """
+        Args:
+            ids: NumPy array of doc_ids, sorted ascending
+            offsets: NumPy int64 array of len(ids) + 1 byte offsets into chars
+            chars: NumPy uint8 array of the concatenated UTF-8 titles
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.chars = chars
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Build from a dictionary mapping doc_id -> title.
+        
+        Args:
+            d: Dictionary mapping doc_id -> title
+        
+        Returns:
+            DocTitles object
+        """
+        ids = np.fromiter(d.keys(), dtype=np.int64, count=len(d))
+        order = np.argsort(ids)
+        titles = list(d.values())
+        encoded = [titles[i].encode('utf-8') for i in order.tolist()]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        chars = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(ids[order], offsets, chars)
+
+    def save(self, prefix):
+        """
+        Write the arrays as <prefix>_ids.npy, <prefix>_offsets.npy and <prefix>_chars.npy.
+        
+        Args:
+            prefix: Path prefix of the three .npy files
+        """
+        for suffix, arr in zip(self.SUFFIXES, (self.ids, self.offsets, self.chars)):
+            np.save(prefix + suffix, arr)
+
+    @classmethod
+    def load(cls, prefix):
+        """
+        Open arrays written by save() as read-only memory maps.
+        
+        Args:
+            prefix: Path prefix of the three .npy files
+        
+        Returns:
+            DocTitles object
+        """
+        return cls(*(np.load(prefix + suffix, mmap_mode='r') for suffix in cls.SUFFIXES))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _title(self, pos):
+        """Decode the title stored at position pos."""
+        return bytes(self.chars[self.offsets[pos]:self.offsets[pos + 1]]).decode('utf-8')
+
+    def get_many(self, doc_ids, default=None):
+        """
+        Look up the titles of many doc_ids with one vectorized binary search.
+        
+        Args:
+            doc_ids: Sequence of doc_ids
+            default: Title for doc_ids that are not present
+        
+        Returns:
+            List of titles (same order as doc_ids)
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return [default] * len(doc_ids)
+        pos = np.minimum(np.searchsorted(self.ids, doc_ids), len(self.ids) - 1)
+        found = (self.ids[pos] == doc_ids).tolist()
+        return [self._title(p) if f else default for p, f in zip(pos.tolist(), found)]
+
+    def get(self, doc_id, default=None):
+        """Look up a single doc_id, like dict.get()."""
+        pos = int(np.searchsorted(self.ids, doc_id))
+        if pos < len(self.ids) and self.ids[pos] == doc_id:
+            return self._title(pos)
+        return default
+
+# Live SearchFrontend instances, reset by a single fork hook (see _reset_frontends_after_fork)
+_LIVE_FRONTENDS = weakref.WeakSet()
+
+def _reset_frontends_after_fork():
+    """Call _reset_after_fork() on every live frontend in a forked child process."""
+    for frontend in list(_LIVE_FRONTENDS):
+        frontend._reset_after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_frontends_after_fork)
 
 class SearchFrontend:
     """
@@ -20,32 +306,55 @@ class SearchFrontend:
         self.BUCKET_NAME = 'ir-wiki-hadar'
         
         # Metadata dictionaries - loaded lazily on first use
-        self.page_views = None      # Dictionary mapping doc_id -> view count
-        self.page_rank = None       # Dictionary mapping doc_id -> PageRank score
-        self.id_to_title = None     # Dictionary mapping doc_id -> article title
-        self.doc_norms = None       # Dictionary mapping doc_id -> document length norm (for cosine similarity)
+        self.page_views = None      # DocValues mapping doc_id -> view count
+        self.page_rank = None       # DocValues mapping doc_id -> PageRank score
+        self.id_to_title = None     # DocTitles mapping doc_id -> article title
+        self.doc_norms = None       # DocValues mapping doc_id -> document length norm (for cosine similarity)
+        self.inv_doc_norms = None   # DocValues mapping doc_id -> 1 / document norm (multiplied in scoring)
         
         # Inverted indices for different text fields - loaded lazily on first use
         self.body_index = None      # Inverted index for article body text
         self.title_index = None     # Inverted index for article titles
         self.anchor_index = None    # Inverted index for anchor text (text of links pointing to articles)
         
-        # Google Cloud Storage client (initialized lazily)
+        # Google Cloud Storage client (initialized lazily, shared by the download threads)
         self._storage_client = None
+        self._client_lock = threading.Lock()
+        self._warm_threads = []     # Background threads filling the posting caches
+        # Requests are served by several threads; each lazily loaded resource is loaded once
+        self._load_locks = {name: threading.Lock() for name in ('metadata', 'body', 'title', 'anchor')}
+        _LIVE_FRONTENDS.add(self)  # Reset by the module-level fork hook
 
         # Common English stopwords to filter out during tokenization
         self.stopwords = frozenset(['the', 'and', 'to', 'of', 'a', 'in', 'is', 'it', 'that', 'for', 'you', 'he', 'was', 'on', 'are', 'with', 'as', 'i', 'his', 'they', 'be', 'at', 'one', 'have', 'this', 'from', 'or', 'had', 'by', 'not', 'word', 'but', 'what', 'some', 'we', 'can', 'out', 'other', 'were', 'all', 'there', 'when', 'up', 'use', 'your', 'how', 'said', 'an', 'each', 'she'])
         
         # Regex pattern to extract words (2-24 characters, can include hashtags, mentions, hyphens, apostrophes)
-        self.re_word = re.compile(r"""[\#\@\w](['\-]?\w){2,24}""", re.UNICODE)
+        # (non-capturing group, so findall() returns whole matches)
+        self.re_word = re.compile(r"""[\#\@\w](?:['\-]?\w){2,24}""", re.UNICODE)
+
+        # Query traffic repeats the same strings, so tokenization is memoized
+        # (posting lists are cached by the index itself)
+        self.tokenize = lru_cache(maxsize=10000)(self.tokenize)
+        self._body_idf = {}         # term -> IDF in the body index, precomputed when the body index is loaded
+
+    def _reset_after_fork(self):
+        """
+        Drop the parent's storage client in a forked child process
+        (gunicorn --preload worker); loaded metadata and indices are kept.
+        """
+        self._storage_client = None
+        self._client_lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self._load_locks}
 
     def _client(self):
         """
         Lazy initialization of Google Cloud Storage client.
-        Returns the existing client or creates a new one if not initialized.
+        Returns the existing client or fetches the process-wide one if not initialized.
         """
-        if self._storage_client is None:
-            self._storage_client = storage.Client()
+        with self._client_lock:
+            if self._storage_client is None:
+                # Same pooled client (keep-alive connections) as the index readers
+                self._storage_client = get_client()
         return self._storage_client
 
     def _download_pickle(self, gcs_path, local_path):
@@ -64,24 +373,37 @@ class SearchFrontend:
         if os.path.exists(local_path):
             try:
                 with open(local_path, 'rb') as f:
-                    return pickle.load(f)
+                    return _load_pickle(f)
             except: pass 
         
-        # Download from GCS and save locally
+        # Download from GCS and save locally (large chunks, no transcoding)
         try:
             bucket = self._client().bucket(self.BUCKET_NAME)
-            blob = bucket.blob(gcs_path)
-            blob.download_to_filename(local_path)
+            blob = bucket.blob(gcs_path, chunk_size=DOWNLOAD_CHUNK_SIZE)
+            blob.download_to_filename(local_path, raw_download=True)
             with open(local_path, 'rb') as f:
-                return pickle.load(f)
+                return _load_pickle(f)
         except: return None
 
+    def _load_locs_blob(self, blob):
+        """
+        Download and unpickle a single _posting_locs.pickle blob.
+        
+        Args:
+            blob: GCS blob of a posting location file
+        
+        Returns:
+            Dictionary mapping term -> list of (file_name, offset, ...) locations
+        """
+        with blob.open("rb", chunk_size=DOWNLOAD_CHUNK_SIZE) as f:
+            return _load_pickle(f)
 
     def _load_extra_locs(self, index, prefix):
         """
         Load additional posting list locations from split files in GCS.
         The inverted index is split across multiple files for efficiency.
         This method loads all the _posting_locs.pickle files and merges them into the main index.
+        The files are downloaded in parallel and merged in listing order.
         
         Args:
             index: The InvertedIndex object to update
@@ -90,17 +412,16 @@ class SearchFrontend:
         if not index: return
         try:
             bucket = self._client().bucket(self.BUCKET_NAME)
-            blobs = bucket.list_blobs(prefix=prefix)
-            # Find and load all posting location files
-            for blob in blobs:
-                if '_posting_locs.pickle' in blob.name:
-                    with blob.open("rb") as f:
-                        locs = pickle.load(f)
-                        # Merge posting locations into the main index
-                        index.posting_locs.update(locs)
-                        # Update document frequency for each term
-                        for word in locs.keys():
-                            index.df[word] = index.df.get(word, 0) + 1
+            # List once, then fetch all posting location files concurrently
+            blobs = [b for b in bucket.list_blobs(prefix=prefix) if '_posting_locs.pickle' in b.name]
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+                all_locs = list(pool.map(self._load_locs_blob, blobs))
+            for locs in all_locs:
+                # Merge posting locations into the main index
+                index.posting_locs.update(locs)
+                # Update document frequency for each term
+                for word in locs.keys():
+                    index.df[word] = index.df.get(word, 0) + 1
             
             print(f"DEBUG: Total terms now in index.df: {len(index.df)}")
         except Exception as e:
@@ -109,17 +430,79 @@ class SearchFrontend:
 
 
 
+    def _warm_index(self, index, term_filter=None):
+        """
+        Pre-load the posting lists of an index's most frequent terms into its
+        posting cache on a background thread, so the load itself (and the
+        query that triggered it) does not wait for the downloads.
+        
+        Args:
+            index: The InvertedIndex object to warm up
+            term_filter: Optional predicate selecting the terms worth warming
+        """
+        def warm():
+            try:
+                terms = index.warm_posting_cache(index.base_dir, HOT_TERMS, self.BUCKET_NAME, term_filter)
+                print(f"DEBUG: Warmed {len(terms)} posting lists in {index.base_dir}")
+            except Exception as e:
+                print(f"DEBUG: Error in _warm_index: {e}")
+        thread = threading.Thread(target=warm, daemon=True)
+        thread.start()
+        self._warm_threads.append(thread)
+
+    def _load_table(self, name, table_cls, *args):
+        """
+        Load a doc_id -> value metadata table (DocValues or DocTitles) as memory maps.
+        Uses the local .npy files if present, then .npy files in GCS, and
+        finally converts the pickled dictionary once and saves the .npy files
+        locally so later starts skip unpickling.
+        
+        Args:
+            name: Base name of the table (e.g. 'page_rank' for page_rank.pkl)
+            table_cls: DocValues or DocTitles
+            *args: Extra arguments for table_cls.from_dict (e.g. the dtype of DocValues)
+        
+        Returns:
+            table_cls object (empty if nothing could be loaded)
+        """
+        paths = [name + suffix for suffix in table_cls.SUFFIXES]
+        if not all(os.path.exists(p) for p in paths):
+            try:
+                bucket = self._client().bucket(self.BUCKET_NAME)
+                for p in paths:
+                    bucket.blob(p).download_to_filename(p, raw_download=True)
+            except:
+                # No .npy files in the bucket - convert the pickle
+                for p in paths:
+                    if os.path.exists(p): os.remove(p)
+                d = self._download_pickle(f'{name}.pkl', f'{name}.pkl')
+                if not d:
+                    return table_cls.from_dict({}, *args)
+                table_cls.from_dict(d, *args).save(name)
+        return table_cls.load(name)
+
     def load_metadata(self):
         """
-        Load all metadata dictionaries from GCS (lazy loading).
+        Load all metadata from GCS (lazy loading).
         This includes: document titles, document norms for TF-IDF, page views, and PageRank scores.
-        Only loads once on first call.
+        All four are memory-mapped arrays (DocTitles / DocValues) instead of dictionaries.
+        The four tables are loaded in parallel. Only loads once on first call, even when
+        several request threads arrive at the same time.
         """
         if self.id_to_title is None:
-            self.id_to_title = self._download_pickle('id_to_title.pkl', 'id_to_title.pkl') or {}
-            self.doc_norms = self._download_pickle('doc_norms.pkl', 'doc_norms.pkl') or {}
-            self.page_views = self._download_pickle('page_views.pkl', 'page_views.pkl') or {}
-            self.page_rank = self._download_pickle('page_rank.pkl', 'page_rank.pkl') or {}
+            with self._load_locks['metadata']:
+                if self.id_to_title is None:
+                    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+                        titles = pool.submit(self._load_table, 'id_to_title', DocTitles)
+                        doc_norms = pool.submit(self._load_table, 'doc_norms', DocValues, np.float64)
+                        page_views = pool.submit(self._load_table, 'page_views', DocValues, np.int64)
+                        page_rank = pool.submit(self._load_table, 'page_rank', DocValues, np.float64)
+                    self.doc_norms = doc_norms.result()
+                    self.inv_doc_norms = self.doc_norms.reciprocal('doc_norms_reciprocals.npy')
+                    self.page_views = page_views.result()
+                    self.page_rank = page_rank.result()
+                    # Assigned last: it doubles as the "already loaded" flag
+                    self.id_to_title = titles.result()
 
     def load_body_index(self):
         """
@@ -128,11 +511,41 @@ class SearchFrontend:
         Also loads split posting location files.
         """
         if self.body_index is None:
-            self.body_index = self._download_pickle('postings_gcp/index.pkl', 'index_body.pkl')
-            if self.body_index:
-                self.body_index.base_dir = 'postings_gcp'
-                # Load additional posting locations from split files
-                self._load_extra_locs(self.body_index, 'postings_gcp/')
+            with self._load_locks['body']:
+                if self.body_index is None:
+                    index = self._download_pickle('postings_gcp/index.pkl', 'index_body.pkl')
+                    if index:
+                        index.base_dir = 'postings_gcp'
+                        # Load additional posting locations from split files
+                        self._load_extra_locs(index, 'postings_gcp/')
+                        self._body_idf = self._build_body_idf(index)
+                        # The most frequent terms are the ones _body_terms() drops (IDF < MIN_BODY_IDF),
+                        # so they are not worth cache space
+                        body_idf = self._body_idf
+                        self._warm_index(index, lambda t: body_idf.get(t, 0.0) >= MIN_BODY_IDF)
+                    # Published last, so other threads never see a half-loaded index
+                    self.body_index = index
+
+    def _build_body_idf(self, index):
+        """
+        Precompute the IDF, log10(N / df), of every term in the body index
+        in one vectorized pass, so queries only look values up.
+        N (the number of documents) comes from the document norms.
+        
+        Args:
+            index: The body InvertedIndex
+        
+        Returns:
+            Dictionary mapping term -> IDF
+        """
+        self.load_metadata()
+        N = len(self.doc_norms) if self.doc_norms else 6000000
+        df = index.df
+        terms = list(df.keys())
+        counts = np.fromiter(df.values(), dtype=np.float64, count=len(terms))
+        present = counts > 0
+        idf = np.log10(N / counts[present])
+        return dict(zip([t for t, p in zip(terms, present.tolist()) if p], idf.tolist()))
 
     def load_title_index(self):
         """
@@ -141,11 +554,15 @@ class SearchFrontend:
         Title matches are generally more relevant than body matches.
         """
         if self.title_index is None:
-            self.title_index = self._download_pickle('title_index/index.pkl', 'index_title.pkl')
-            if self.title_index:
-                self.title_index.base_dir = 'title_index'
-                # Load additional posting locations from split files
-                self._load_extra_locs(self.title_index, 'title_index/')
+            with self._load_locks['title']:
+                if self.title_index is None:
+                    index = self._download_pickle('title_index/index.pkl', 'index_title.pkl')
+                    if index:
+                        index.base_dir = 'title_index'
+                        # Load additional posting locations from split files
+                        self._load_extra_locs(index, 'title_index/')
+                        self._warm_index(index)
+                    self.title_index = index
 
     def load_anchor_index(self):
         """
@@ -154,11 +571,28 @@ class SearchFrontend:
         Anchor text often provides good descriptions of what an article is about.
         """
         if self.anchor_index is None:
-            self.anchor_index = self._download_pickle('anchor_index/index.pkl', 'index_anchor.pkl')
-            if self.anchor_index:
-                self.anchor_index.base_dir = 'anchor_index'
-                # Critical: Load split posting location files
-                self._load_extra_locs(self.anchor_index, 'anchor_index/')
+            with self._load_locks['anchor']:
+                if self.anchor_index is None:
+                    index = self._download_pickle('anchor_index/index.pkl', 'index_anchor.pkl')
+                    if index:
+                        index.base_dir = 'anchor_index'
+                        # Critical: Load split posting location files
+                        self._load_extra_locs(index, 'anchor_index/')
+                        self._warm_index(index)
+                    self.anchor_index = index
+
+    def preload(self):
+        """
+        Load all metadata and indices and wait until their posting caches are warm.
+        Used at startup (PRELOAD=1) so no request pays the loading cost; under
+        gunicorn --preload this runs once, before the workers are forked.
+        """
+        self.load_metadata()
+        self.load_body_index()
+        self.load_title_index()
+        self.load_anchor_index()
+        for thread in self._warm_threads:
+            thread.join()
 
     def tokenize(self, text):
         """
@@ -173,26 +607,292 @@ class SearchFrontend:
             text: Query string to tokenize
         
         Returns:
-            List of tokenized terms
+            Tuple of tokenized terms (immutable, since results are memoized)
+        """
+        stopwords = self.stopwords  # Local binding, looked up once per call
+        # findall() builds all match strings in C; each is lowercased once, then filtered
+        return tuple(w for w in map(str.lower, self.re_word.findall(text)) if w not in stopwords)
+
+    def _idf(self, token, N):
+        """
+        IDF of a token in the body index: log10(N / df), read from the table
+        built by _build_body_idf() (computed and stored if it is missing).
+        
+        Args:
+            token: Term present in the body index
+            N: Total number of documents
+        
+        Returns:
+            IDF value (float)
         """
-        return [t.group().lower() for t in self.re_word.finditer(text) if t.group().lower() not in self.stopwords]
+        idf = self._body_idf.get(token)
+        if idf is None:
+            idf = self._body_idf[token] = math.log(N / self.body_index.df[token], 10)
+        return idf
 
-    def _get_posting(self, index, token):
+    def _get_posting_np(self, index, token):
         """
-        Retrieve the posting list for a given token from an inverted index.
+        Retrieve the posting list for a given token as two parallel NumPy arrays.
         
         Args:
             index: The InvertedIndex object to query
             token: The term to look up
         
         Returns:
-            List of tuples (doc_id, term_frequency) for documents containing the token
-            Returns empty list if token not found or error occurs
+            Tuple (doc_ids, tfs) of NumPy arrays
+            Returns two empty arrays if token not found or error occurs
         """
-        if not index or token not in index.df: return []
+        empty = (np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16))
+        if not index or token not in index.df: return empty
         try:
-            return index.read_a_posting_list(index.base_dir, token, self.BUCKET_NAME)
-        except: return []
+            return index.read_a_posting_array(index.base_dir, token, self.BUCKET_NAME)
+        except: return empty
+
+    def _get_postings_np(self, index, tokens):
+        """
+        Retrieve the posting lists of several tokens at once, reading them concurrently.
+        
+        Args:
+            index: The InvertedIndex object to query
+            tokens: Iterable of terms to look up
+        
+        Returns:
+            Dictionary mapping each token found in the index -> (doc_ids, tfs) NumPy arrays
+        """
+        return self._postings_result(index, self._submit_postings_np(index, tokens))
+
+    def _submit_postings_np(self, index, tokens):
+        """
+        Start reading the posting lists of several tokens on the index's shared
+        term-read pool, without waiting for them.
+        
+        Args:
+            index: The InvertedIndex object to query
+            tokens: Iterable of terms to look up
+        
+        Returns:
+            Dictionary mapping each token found in the index -> Future of (doc_ids, tfs)
+        """
+        if not index: return {}
+        tokens = [t for t in tokens if t in index.df]
+        try:
+            return index.submit_posting_reads(index.base_dir, tokens, self.BUCKET_NAME)
+        except:
+            return {t: None for t in tokens}
+
+    def _postings_result(self, index, futures):
+        """
+        Wait for reads started by _submit_postings_np().
+        
+        Args:
+            index: The InvertedIndex object the reads were started on
+            futures: Dictionary mapping token -> Future (or None if it could not be started)
+        
+        Returns:
+            Dictionary mapping token -> (doc_ids, tfs) NumPy arrays
+        """
+        postings = {}
+        for t, future in futures.items():
+            try:
+                postings[t] = future.result()
+            except:
+                # Retry the failed token alone so a single bad term does not fail the query
+                postings[t] = self._get_posting_np(index, t)
+        return postings
+
+    def _match_counts(self, index, tokens):
+        """
+        Count, for every document, how many query terms it contains in an index.
+        
+        The posting lists are read concurrently through the posting cache
+        (_get_postings_np) and counted with NumPy: a term repeated in the
+        query counts once per occurrence but is fetched once.
+        
+        Args:
+            index: The InvertedIndex object to query
+            tokens: Query terms
+        
+        Returns:
+            Tuple (doc_ids, counts) of NumPy arrays, sorted by count (descending)
+        """
+        qtf = Counter(tokens)
+        postings = self._get_postings_np(index, qtf)
+        if not postings:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        ids = np.concatenate([doc_ids for doc_ids, _ in postings.values()])
+        weights = np.repeat([qtf[t] for t in postings], [len(doc_ids) for doc_ids, _ in postings.values()])
+        doc_ids, inverse = np.unique(ids, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights, minlength=len(doc_ids)).astype(np.int64)
+        order = np.argsort(-counts, kind='stable')
+        return doc_ids[order], counts[order]
+
+    def _body_terms(self, tokens, N):
+        """
+        Select the query terms worth scoring against the body index.
+        
+        Terms with IDF below MIN_BODY_IDF are skipped, unless all of them are
+        (then the rarest one is scored, so the query still gets results). The
+        rest are taken from the rarest up while their postings fit in
+        BODY_POSTINGS_BUDGET (the rarest term is always kept), which bounds
+        the work of any query.
+        
+        Args:
+            tokens: Query terms
+            N: Total number of documents
+        
+        Returns:
+            List of distinct terms, rarest first
+        """
+        if not self.body_index: return []
+        df = self.body_index.df
+        terms = sorted((t for t in dict.fromkeys(tokens) if t in df), key=lambda t: df[t])
+        terms = [t for t in terms if self._idf(t, N) >= MIN_BODY_IDF] or terms[:1]
+        selected, total = [], 0
+        for t in terms:
+            total += df[t]
+            if selected and total > BODY_POSTINGS_BUDGET:
+                break
+            selected.append(t)
+        return selected
+
+    def _body_tfidf(self, token, N, posting=None):
+        """
+        Normalized TF-IDF contributions of a token to every document containing it,
+        computed for the whole posting list in one vectorized expression.
+        
+        Args:
+            token: Term present in the body index
+            N: Total number of documents
+            posting: Optional (doc_ids, tfs) arrays already read for the token
+        
+        Returns:
+            Tuple (doc_ids, contributions) of NumPy arrays
+        """
+        doc_ids, tfs = posting if posting is not None else self._get_posting_np(self.body_index, token)
+        return doc_ids, tfs * self._idf(token, N) * self.inv_doc_norms.get_many(doc_ids, 1)
+
+    @staticmethod
+    def _union(arrays):
+        """Sorted distinct doc_ids found in any of the given arrays."""
+        if len(arrays) == 1:
+            return np.asarray(arrays[0])  # Posting lists are already sorted and distinct
+        ids = np.sort(np.concatenate(arrays))
+        return ids[np.r_[True, ids[1:] != ids[:-1]]]
+
+    @staticmethod
+    def _score_candidates(doc_ids, lists):
+        """
+        Exact scores of the given documents, found by binary search in each
+        posting list instead of merging the lists.
+        
+        Args:
+            doc_ids: Sorted NumPy array of candidate doc_ids
+            lists: List of (doc_ids, contributions) arrays, each sorted by doc_id
+        
+        Returns:
+            NumPy array of scores (same order as doc_ids)
+        """
+        scores = np.zeros(len(doc_ids))
+        for ids, contrib in lists:
+            pos = np.minimum(np.searchsorted(ids, doc_ids), len(ids) - 1)
+            scores += np.where(ids[pos] == doc_ids, contrib[pos], 0)
+        return scores
+
+    def _maxscore_candidates(self, lists, k):
+        """
+        MaxScore pruning: find a set of documents that is guaranteed to contain
+        the top k, without merging the posting lists that cannot promote a
+        document into the top k on their own.
+        
+        1. Score exactly the best k documents of every list; the k-th best of
+           those scores (theta) is a lower bound on the final k-th score.
+        2. Sort the lists by their largest contribution. The lists whose
+           largest contributions sum to less than theta are "non-essential":
+           a document found only in them cannot reach the top k.
+        3. The candidates are the documents of the remaining (essential) lists.
+        
+        Args:
+            lists: List of (doc_ids, contributions) arrays, each sorted by doc_id
+            k: Number of results to return
+        
+        Returns:
+            Sorted NumPy array of candidate doc_ids, or None when pruning
+            would not save work (the lists should then be merged in full)
+        """
+        total = sum(len(ids) for ids, _ in lists)
+        if len(lists) < 2 or total < MAXSCORE_MIN_POSTINGS:
+            return None
+        max_contrib = np.array([contrib.max() for _, contrib in lists])
+        order = np.argsort(max_contrib)
+        # The list with the largest contribution is always essential; if even it alone
+        # is too many candidates, skip computing theta
+        if 4 * len(lists[order[-1]][0]) * len(lists) >= total:
+            return None
+        seeds = self._union([
+            ids if len(ids) <= k else np.sort(ids[np.argpartition(-contrib, k - 1)[:k]])
+            for ids, contrib in lists])
+        if len(seeds) < k:
+            return None
+        seed_scores = self._score_candidates(seeds, lists)
+        theta = np.partition(seed_scores, len(seeds) - k)[len(seeds) - k]
+        
+        # Small margin so rounding in the bound never prunes a top-k document
+        n_skip = int(np.searchsorted(np.cumsum(max_contrib[order]) * (1 + 1e-9), theta))
+        if n_skip == 0:
+            return None
+        essential = [lists[i][0] for i in order[n_skip:].tolist()]
+        candidates = self._union(essential)
+        # Binary-searching every list per candidate must clearly beat merging
+        # them all (random lookups cost several times a sequential merge step)
+        if 4 * len(candidates) * len(lists) >= total:
+            return None
+        return candidates
+
+    def _top_k(self, ids_list, scores_list, k=100):
+        """
+        Sum per-document score contributions and return the k best documents.
+        
+        Long queries are first pruned with MaxScore (see _maxscore_candidates),
+        so only documents that can still reach the top k are scored.
+        
+        Args:
+            ids_list: List of NumPy arrays of doc_ids (each sorted, as read from the index)
+            scores_list: List of NumPy arrays of score contributions (same shapes as ids_list)
+            k: Number of results to return
+        
+        Returns:
+            List of up to k tuples (doc_id, title) sorted by score (descending)
+        """
+        lists = [(ids, contrib) for ids, contrib in zip(ids_list, scores_list) if len(ids)]
+        if not lists: return []
+        doc_ids = self._maxscore_candidates(lists, k)
+        if doc_ids is not None:
+            scores = self._score_candidates(doc_ids, lists)
+        else:
+            # Merge the postings into doc_id order, then sum each run of equal doc_ids
+            ids = np.concatenate([ids for ids, _ in lists])
+            order = np.argsort(ids, kind='stable')
+            ids = ids[order]
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            doc_ids = ids[starts]
+            scores = np.add.reduceat(np.concatenate([c for _, c in lists])[order], starts)
+        # Partial selection of the top k, then sort only those k
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return self._with_titles(doc_ids[top].tolist())
+
+    def _with_titles(self, doc_ids):
+        """
+        Pair ranked doc_ids with their titles.
+        
+        Args:
+            doc_ids: List of doc_ids in rank order
+        
+        Returns:
+            List of tuples (doc_id as str, title), "Unknown" for missing titles
+        """
+        return list(zip(map(str, doc_ids), self.id_to_title.get_many(doc_ids, "Unknown")))
 
     def search_title(self, query):
         """
@@ -208,13 +908,9 @@ class SearchFrontend:
             List of tuples (doc_id, title) sorted by relevance score (descending)
         """
         self.load_metadata(); self.load_title_index()
-        tokens = self.tokenize(query); scores = Counter()
         # Count how many query terms appear in each document's title
-        for t in tokens:
-            for d, _ in self._get_posting(self.title_index, t):
-                scores[int(d)] += 1
-        res = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        return [(str(d), self.id_to_title.get(int(d), "Unknown")) for d, _ in res]
+        doc_ids, _ = self._match_counts(self.title_index, self.tokenize(query))
+        return self._with_titles(doc_ids.tolist())
 
     def search_anchor(self, query):
         """
@@ -232,13 +928,9 @@ class SearchFrontend:
         """
         self.load_metadata(); self.load_anchor_index()
         print(f"DEBUG: Sample keys in anchor index: {list(self.anchor_index.df.keys())[:10]}")
-        tokens = self.tokenize(query); scores = Counter()
         # Count how many query terms appear in anchor text pointing to each document
-        for t in tokens:
-            for d, _ in self._get_posting(self.anchor_index, t):
-                scores[int(d)] += 1
-        res = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        return [(str(d), self.id_to_title.get(int(d), "Unknown")) for d, _ in res]
+        doc_ids, _ = self._match_counts(self.anchor_index, self.tokenize(query))
+        return self._with_titles(doc_ids.tolist())
 
 
     def search(self, query):
@@ -251,8 +943,8 @@ class SearchFrontend:
         self.load_body_index()
         self.load_anchor_index()  # הוספנו טעינה של העוגנים
         
-        tokens = self.tokenize(query)
-        scores = Counter()
+        # Each distinct term once, with its number of occurrences in the query (qtf)
+        tokens = Counter(self.tokenize(query))
         N = len(self.doc_norms) if self.doc_norms else 6000000 
         
         # --- הגדרת משקולות חדשות ואגרסיביות ---
@@ -260,29 +952,34 @@ class SearchFrontend:
         w_body = 0.10    # משקל נמוך לגוף
         w_anchor = 0.05  # תוספת קטנה מהעוגנים
         
-        for t in tokens:
-            # 1. Title Signal (הכי חזק)
-            if self.title_index:
-                for d, _ in self._get_posting(self.title_index, t):
-                    scores[int(d)] += w_title * 1  # כל מילה בכותרת שווה המון
+        # קריאה מקבילית של רשימות ה-posting משלושת האינדקסים
+        # (all reads go to the shared term-read pool at once, then are collected)
+        title_f = self._submit_postings_np(self.title_index, tokens)
+        body_f = self._submit_postings_np(self.body_index, self._body_terms(tokens, N))
+        anchor_f = self._submit_postings_np(self.anchor_index, tokens)
+        title_postings = self._postings_result(self.title_index, title_f)
+        body_postings = self._postings_result(self.body_index, body_f)
+        anchor_postings = self._postings_result(self.anchor_index, anchor_f)
+        
+        # All three signals go into one list of contributions, summed once in _top_k
+        ids_list, scores_list = [], []
+        for t, qtf in tokens.items():
+            # 1. Title Signal (הכי חזק) - כל מילה בכותרת שווה המון
+            if t in title_postings:
+                doc_ids = title_postings[t][0]
+                ids_list.append(doc_ids); scores_list.append(np.full(len(doc_ids), qtf * w_title))
             
-            # 2. Body Signal (TF-IDF)
-            if self.body_index and t in self.body_index.df:
-                idf = math.log(N / self.body_index.df[t], 10)
-                for d, tf in self._get_posting(self.body_index, t):
-                    di = int(d)
-                    # נירמול הציון כדי שלא ישתלט על הכותרת
-                    tfidf = (tf * idf) / self.doc_norms.get(di, 1)
-                    scores[di] += w_body * tfidf
+            # 2. Body Signal (TF-IDF) - נירמול הציון כדי שלא ישתלט על הכותרת
+            if t in body_postings:
+                doc_ids, tfidf = self._body_tfidf(t, N, body_postings[t])
+                ids_list.append(doc_ids); scores_list.append(qtf * w_body * tfidf)
 
             # 3. Anchor Signal (תוספת בונוס)
-            if self.anchor_index:
-                for d, _ in self._get_posting(self.anchor_index, t):
-                    scores[int(d)] += w_anchor * 1
+            if t in anchor_postings:
+                doc_ids = anchor_postings[t][0]
+                ids_list.append(doc_ids); scores_list.append(np.full(len(doc_ids), qtf * w_anchor))
 
-        # מיון והחזרת 100 התוצאות הראשונות
-        res = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        return [(str(d), self.id_to_title.get(d, "Unknown")) for d, _ in res[:100]]
+        return self._top_k(ids_list, scores_list, 100)
     
     
     
@@ -294,6 +991,7 @@ class SearchFrontend:
         - TF-IDF = (term frequency * inverse document frequency) / document norm
         - IDF = log10(N / document_frequency)
         - Document norm normalizes for document length
+        - Terms with a very low IDF are not scored (see _body_terms)
         
         Args:
             query: Search query string
@@ -302,20 +1000,19 @@ class SearchFrontend:
             List of top 100 tuples (doc_id, title) sorted by TF-IDF score (descending)
         """
         self.load_metadata(); self.load_body_index()
-        tokens = self.tokenize(query); scores = Counter()
+        tokens = Counter(self.tokenize(query))  # term -> occurrences in the query (qtf)
         N = len(self.doc_norms) if self.doc_norms else 6000000  # Total number of documents
         
-        # Calculate TF-IDF score for each document
-        for t in tokens:
-            if self.body_index and t in self.body_index.df:
-                idf = math.log(N/self.body_index.df[t], 10)
-                for d, tf in self._get_posting(self.body_index, t):
-                    di = int(d)
-                    # Accumulate normalized TF-IDF contribution from each term
-                    scores[di] += (tf*idf)/self.doc_norms.get(di, 1)
+        # Normalized TF-IDF contribution of each distinct term, weighted by its qtf,
+        # one array per posting list (very common terms are left out, see _body_terms)
+        postings = self._get_postings_np(self.body_index, self._body_terms(tokens, N))
+        ids_list, scores_list = [], []
+        for t, qtf in tokens.items():
+            if t in postings:
+                doc_ids, tfidf = self._body_tfidf(t, N, postings[t])
+                ids_list.append(doc_ids); scores_list.append(qtf * tfidf)
         
-        res = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        return [(str(d), self.id_to_title.get(int(d), "Unknown")) for d, _ in res[:100]]
+        return self._top_k(ids_list, scores_list, 100)
 
     def get_pagerank(self, wiki_ids):
         """
@@ -329,7 +1026,8 @@ class SearchFrontend:
             List of PageRank scores (same order as input), 0 if not found
         """
         self.load_metadata()
-        return [self.page_rank.get(int(d), 0) for d in wiki_ids]
+        # One vectorized lookup for the whole batch
+        return self.page_rank.get_many(np.asarray(wiki_ids, dtype=np.int64), 0).tolist()
 
     def get_pageview(self, wiki_ids):
         """
@@ -343,43 +1041,65 @@ class SearchFrontend:
             List of page view counts (same order as input), 0 if not found
         """
         self.load_metadata()
-        return [self.page_views.get(int(d), 0) for d in wiki_ids]
+        # One vectorized lookup for the whole batch
+        return self.page_views.get_many(np.asarray(wiki_ids, dtype=np.int64), 0).tolist()
 
 # Flask application setup
 app = Flask(__name__)
 frontend = SearchFrontend()
 
+# Load everything at import time when PRELOAD=1. With gunicorn --preload this
+# happens once in the master process and the workers inherit the loaded data
+if os.environ.get('PRELOAD') == '1':
+    frontend.preload()
+
+def _json(obj):
+    """
+    Build the JSON response of an endpoint.
+    Uses orjson when installed: its C encoder is several times faster than
+    jsonify on large PageRank/PageView batches. Falls back to jsonify.
+    
+    Args:
+        obj: JSON-serializable result (lists, tuples, str, int, float)
+    
+    Returns:
+        Flask response with mimetype application/json
+    """
+    if orjson is None:
+        return jsonify(obj)
+    return app.response_class(orjson.dumps(obj), mimetype='application/json')
+
 # API Endpoints
 
 @app.route("/search")
 def search():
     """Hybrid search endpoint (title + body). GET parameter: query"""
-    return jsonify(frontend.search(request.args.get('query', '')))
+    return _json(frontend.search(request.args.get('query', '')))
 
 @app.route("/search_body")
 def search_body():
     """Body-only search endpoint using TF-IDF. GET parameter: query"""
-    return jsonify(frontend.search_body(request.args.get('query', '')))
+    return _json(frontend.search_body(request.args.get('query', '')))
 
 @app.route("/search_title")
 def search_title():
     """Title-only search endpoint. GET parameter: query"""
-    return jsonify(frontend.search_title(request.args.get('query', '')))
+    return _json(frontend.search_title(request.args.get('query', '')))
 
 @app.route("/search_anchor")
 def search_anchor():
     """Anchor text search endpoint. GET parameter: query"""
-    return jsonify(frontend.search_anchor(request.args.get('query', '')))
+    return _json(frontend.search_anchor(request.args.get('query', '')))
 
 @app.route("/get_pagerank", methods=['POST'])
 def get_pagerank():
     """Get PageRank scores. POST body: JSON list of doc IDs"""
-    return jsonify(frontend.get_pagerank(request.get_json() or []))
+    return _json(frontend.get_pagerank(request.get_json() or []))
 
 @app.route("/get_pageview", methods=['POST'])
 def get_pageview():
     """Get page view counts. POST body: JSON list of doc IDs"""
-    return jsonify(frontend.get_pageview(request.get_json() or []))
+    return _json(frontend.get_pageview(request.get_json() or []))
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, debug=False)
+    app.run(host='0.0.0.0', port=8080, debug=False, threaded=True)
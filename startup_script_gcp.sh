@@ -20,5 +20,8 @@ pip install \
   'nltk==3.6.3' \
   'pandas' \
   'google-cloud-storage' \
-  'numpy>=1.23.2,<3'
+  'numpy>=1.23.2,<3' \
+  'numba' \
+  'gunicorn' \
+  'orjson'
 "
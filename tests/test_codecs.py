@@ -0,0 +1,149 @@
+"""
+Round-trip tests for the posting list codecs of inverted_index_gcp and for
+reading encoded lists back from the posting files.
+
+Run with: python -m pytest -q tests
+"""
+import sys
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import inverted_index_gcp as ig
+
+# Encoder / decoder pairs of every compressed format
+CODECS = {
+    'vbyte': (ig._encode_posting_list_vbyte, ig._decode_posting_list_vbyte),
+    'roaring': (ig._encode_posting_list_roaring, ig._decode_posting_list_roaring),
+    'elias_fano': (ig._encode_posting_list_elias_fano, ig._decode_posting_list_elias_fano),
+    'compressed': (ig._encode_posting_list_compressed, ig._decode_posting_list_compressed),
+}
+
+# Block size used by the multi-file tests, so lists span several files
+SMALL_BLOCK = 1000
+
+
+def _posting(doc_ids, tfs=None):
+    """Build (doc_ids, tfs) arrays; tfs default to 1."""
+    doc_ids = np.asarray(doc_ids, dtype=np.uint32)
+    tfs = np.ones(len(doc_ids), dtype=np.uint16) if tfs is None else np.asarray(tfs, dtype=np.uint16)
+    return doc_ids, tfs
+
+
+def _random_posting(rng, n, high):
+    """n distinct sorted doc_ids below high, with random tfs."""
+    doc_ids = np.sort(rng.choice(high, n, replace=False))
+    return _posting(doc_ids, rng.integers(0, 2 ** 16, n))
+
+
+EDGE_CASES = {
+    'empty': _posting([]),
+    'single': _posting([12345], [7]),
+    'doc_id_0': _posting([0, 1, 5], [1, 2, 3]),
+    'only_doc_id_0': _posting([0], [1]),
+    'tf_0_and_max': _posting([3, 9, 10, 500], [0, 65535, 0, 65535]),
+    'above_2_31': _posting([2 ** 31 - 1, 2 ** 31, 3 * 2 ** 30, 2 ** 32 - 1], [1, 2, 3, 4]),
+    'dense_run': _posting(np.arange(70000, 140000), np.arange(70000) % 65536),
+    'wide_range': _random_posting(np.random.default_rng(0), 5000, 70_000_000),
+}
+
+
+def _assert_same(posting, expected):
+    doc_ids, tfs = posting
+    assert np.array_equal(np.asarray(doc_ids, dtype=np.int64), expected[0].astype(np.int64))
+    assert np.array_equal(np.asarray(tfs, dtype=np.int64), expected[1].astype(np.int64))
+
+
+@pytest.mark.parametrize('codec', sorted(CODECS))
+@pytest.mark.parametrize('case', sorted(EDGE_CASES))
+def test_codec_round_trip(codec, case):
+    encode, decode = CODECS[codec]
+    doc_ids, tfs = EDGE_CASES[case]
+    _assert_same(decode(encode(doc_ids, tfs)), (doc_ids, tfs))
+
+
+@pytest.mark.parametrize('case', sorted(EDGE_CASES))
+def test_compressed_never_larger_than_vbyte(case):
+    doc_ids, tfs = EDGE_CASES[case]
+    b = ig._encode_posting_list_compressed(doc_ids, tfs)
+    assert len(b) <= 1 + len(ig._encode_posting_list_vbyte(doc_ids, tfs))
+
+
+def test_fixed_width_decode():
+    doc_ids, tfs = EDGE_CASES['above_2_31']
+    b = b''.join(ig.POSTING_STRUCT.pack(d, t) for d, t in zip(doc_ids.tolist(), tfs.tolist()))
+    _assert_same(ig._decode_posting_list(b + b'\x01\x02'), (doc_ids, tfs))  # Partial tail ignored
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(ig, 'BLOCK_SIZE', SMALL_BLOCK)
+
+
+def _expected_postings():
+    """Term -> (doc_ids, tfs), with lists much longer than SMALL_BLOCK bytes."""
+    rng = np.random.default_rng(1)
+    postings = {name: EDGE_CASES[name] for name in ('single', 'doc_id_0', 'tf_0_and_max', 'above_2_31')}
+    postings['long_sparse'] = _random_posting(rng, 3000, 70_000_000)
+    postings['long_dense'] = _posting(np.arange(0, 20000), rng.integers(0, 2 ** 16, 20000))
+    postings['long_mid'] = _random_posting(rng, 2000, 200000)
+    postings['long_bitmap'] = _posting(np.arange(5, 2 ** 17))
+    return postings
+
+
+def test_block_postings_cover_every_format():
+    formats = {ig._encode_posting_list_compressed(doc_ids, tfs)[0]
+               for doc_ids, tfs in _expected_postings().values()}
+    assert formats == {ig.VBYTE_FORMAT, ig.ROARING_FORMAT, ig.ELIAS_FANO_FORMAT}
+
+
+def _index_for(postings, locs):
+    index = ig.InvertedIndex()
+    for w, (doc_ids, _) in postings.items():
+        index.df[w] = len(doc_ids)
+    index.posting_locs.update(locs)
+    return index
+
+
+def _write_compressed(tmp_path, postings):
+    items = ((w, doc_ids, tfs) for w, (doc_ids, tfs) in postings.items())
+    return ig.InvertedIndex._write_posting_arrays(items, str(tmp_path), 'test')
+
+
+def _write_fixed_width(tmp_path, postings):
+    """Write lists in the older 6-byte format, with (filename, offset) locations."""
+    locs = {}
+    with closing(ig.MultiFileWriter(str(tmp_path), 'legacy')) as writer:
+        for w, (doc_ids, tfs) in postings.items():
+            b = b''.join(ig.POSTING_STRUCT.pack(d, t) for d, t in zip(doc_ids.tolist(), tfs.tolist()))
+            locs[w] = writer.write(b)
+    return locs
+
+
+@pytest.mark.parametrize('write', [_write_compressed, _write_fixed_width])
+def test_reads_across_block_boundaries(tmp_path, small_blocks, write):
+    postings = _expected_postings()
+    index = _index_for(postings, write(tmp_path, postings))
+    base_dir = str(tmp_path)
+    assert len(index.posting_locs['long_sparse']) > 1  # Spans several files
+
+    for w, expected in postings.items():
+        _assert_same(index.read_a_posting_array(base_dir, w), expected)
+        _assert_same(index.read_a_posting_array(base_dir, w), expected)  # From the cache
+
+    seen = set()
+    for w, posting_list in index.posting_lists_iter(base_dir):
+        _assert_same((np.array([d for d, _ in posting_list]), np.array([tf for _, tf in posting_list])),
+                     postings[w])
+        seen.add(w)
+    assert seen == set(postings)
+
+
+def test_missing_term(tmp_path):
+    index = _index_for({}, {})
+    doc_ids, tfs = index.read_a_posting_array(str(tmp_path), 'missing')
+    assert len(doc_ids) == len(tfs) == 0
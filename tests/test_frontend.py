@@ -0,0 +1,168 @@
+"""
+Tests for search_frontend: metadata table loading, title/anchor matching,
+top-k selection and query term selection.
+
+Run with: python -m pytest -q tests
+"""
+import gc
+import os
+import sys
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import inverted_index_gcp as ig
+import search_frontend as sf
+
+
+@pytest.fixture
+def frontend():
+    fe = sf.SearchFrontend()
+    fe.id_to_title = sf.DocTitles.from_dict({})
+    return fe
+
+
+@pytest.fixture
+def offline(frontend, monkeypatch, tmp_path):
+    """Run in an empty directory, with GCS unavailable and pickles served from `pickles`."""
+    monkeypatch.chdir(tmp_path)
+    pickles = {}
+    def no_client():
+        raise OSError('no GCS in tests')
+    monkeypatch.setattr(frontend, '_client', no_client)
+    monkeypatch.setattr(frontend, '_download_pickle', lambda blob_path, local_path: pickles.get(blob_path))
+    return pickles
+
+
+def test_load_table_converts_pickle_once(frontend, offline):
+    offline['page_rank.pkl'] = {7: 0.5, 3: 1.5, 2 ** 31 + 1: 2.0}
+    offline['id_to_title.pkl'] = {5: 'Tel Aviv', 1: 'תל אביב'}
+    ranks = frontend._load_table('page_rank', sf.DocValues, np.float64)
+    titles = frontend._load_table('id_to_title', sf.DocTitles)
+    assert isinstance(ranks.values, np.memmap) and isinstance(titles.chars, np.memmap)
+    assert ranks.get_many([3, 7, 2 ** 31 + 1, 4]).tolist() == [1.5, 0.5, 2.0, 0.0]
+    assert titles.get_many([1, 5, 9], 'Unknown') == ['תל אביב', 'Tel Aviv', 'Unknown']
+
+    offline.clear()  # Later loads use the saved .npy files
+    assert frontend._load_table('page_rank', sf.DocValues, np.float64).get(3) == 1.5
+    assert frontend._load_table('id_to_title', sf.DocTitles).get(5) == 'Tel Aviv'
+
+
+def test_load_table_missing(frontend, offline):
+    table = frontend._load_table('page_views', sf.DocValues, np.int64)
+    assert len(table) == 0 and table.get_many([1]).tolist() == [0]
+
+
+def test_load_metadata_maps_reciprocal_norms(frontend, offline):
+    frontend.id_to_title = None
+    offline['doc_norms.pkl'] = {4: 2.0, 1: 0.0, 9: 0.5}
+    frontend.load_metadata()
+    inv = frontend.inv_doc_norms
+    assert isinstance(inv.values, np.memmap) and isinstance(frontend.doc_norms.values, np.memmap)
+    assert inv.get_many([1, 4, 9, 5], 1).tolist() == [0.0, 0.5, 2.0, 1.0]
+    assert len(frontend.page_rank) == 0 and len(frontend.id_to_title) == 0
+
+
+def test_reciprocal_is_rebuilt_for_a_changed_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(sf, 'RECIPROCAL_CHUNK', 2)  # Several chunks
+    path = str(tmp_path / 'inv.npy')
+    sf.DocValues.from_dict({1: 4.0, 2: 0.0, 3: 8.0}, np.float64).save(str(tmp_path / 'norms'))
+    norms = sf.DocValues.load(str(tmp_path / 'norms'))
+    assert norms.reciprocal(path).values.tolist() == [0.25, 0.0, 0.125]
+    sf.DocValues.from_dict({1: 2.0, 2: 1.0}, np.float64).save(str(tmp_path / 'norms'))
+    assert sf.DocValues.load(str(tmp_path / 'norms')).reciprocal(path).values.tolist() == [0.5, 1.0]
+
+
+def _local_index(tmp_path, docs):
+    index = ig.InvertedIndex(docs)
+    index.write_posting_lists(str(tmp_path), 0)
+    index.base_dir = str(tmp_path)
+    return index
+
+
+def test_search_title_counts_query_terms(frontend, tmp_path):
+    frontend.BUCKET_NAME = None
+    frontend.id_to_title = sf.DocTitles.from_dict({1: 'One', 2: 'Two', 3: 'Three'})
+    frontend.title_index = _local_index(tmp_path, {1: ['apple'], 2: ['apple', 'pear'], 3: ['pear']})
+    assert frontend.search_title('apple pear') == [('2', 'Two'), ('1', 'One'), ('3', 'Three')]
+    # A repeated query term counts once per occurrence
+    assert frontend.search_title('pear apple apple') == [('2', 'Two'), ('1', 'One'), ('3', 'Three')]
+    assert frontend.search_title('pear pear apple') == [('2', 'Two'), ('3', 'Three'), ('1', 'One')]
+    assert frontend.search_title('banana') == []
+    frontend.anchor_index = frontend.title_index
+    assert frontend.search_anchor('pear') == [('2', 'Two'), ('3', 'Three')]
+
+
+def test_maxscore_matches_full_merge(frontend, monkeypatch):
+    rng = np.random.default_rng(1)
+    n_pruned = 0
+    for _ in range(300):
+        lists = []
+        for _ in range(rng.integers(1, 5)):
+            n = int(rng.choice([5, 50, 500, 5000, 200000]))
+            doc_ids = np.unique(rng.integers(0, 1_000_000, n)).astype(np.uint32)
+            weight = rng.choice([0.01, 0.1, 1.0, 5.0])
+            contrib = rng.random(len(doc_ids)) * weight if rng.random() < 0.7 else np.full(len(doc_ids), weight)
+            lists.append((doc_ids, contrib))
+        k = int(rng.choice([1, 10, 100]))
+        ids_list, scores_list = [ids for ids, _ in lists], [c for _, c in lists]
+
+        monkeypatch.setattr(sf, 'MAXSCORE_MIN_POSTINGS', 10 ** 12)  # Always merge in full
+        full = frontend._top_k(ids_list, scores_list, k)
+        monkeypatch.setattr(sf, 'MAXSCORE_MIN_POSTINGS', 0)  # Prune whenever possible
+        n_pruned += frontend._maxscore_candidates(lists, k) is not None
+        pruned = frontend._top_k(ids_list, scores_list, k)
+
+        # Ties may be ordered differently, but the scores of the top k must match exactly
+        all_ids = np.unique(np.concatenate(ids_list))
+        score = dict(zip(all_ids.tolist(), sf.SearchFrontend._score_candidates(all_ids, lists).tolist()))
+        assert [score[int(d)] for d, _ in full] == [score[int(d)] for d, _ in pruned]
+    assert n_pruned > 0
+
+
+def test_body_terms(frontend, monkeypatch):
+    monkeypatch.setattr(sf, 'BODY_POSTINGS_BUDGET', 100)
+    frontend.body_index = ig.InvertedIndex()
+    frontend.body_index.df.update({'the': 900, 'common': 500, 'mid': 60, 'rare': 5, 'rarer': 2})
+    N = 1000  # IDF of 'the' and 'common' is below MIN_BODY_IDF
+    assert frontend._body_terms(('the', 'rare', 'mid', 'common', 'rarer', 'missing'), N) == ['rarer', 'rare', 'mid']
+    assert frontend._body_terms(('mid', 'mid', 'rare'), N) == ['rare', 'mid']
+    # All terms are too common: the rarest one is still scored
+    assert frontend._body_terms(('the', 'common'), N) == ['common']
+    # The budget is exceeded by the rarest term alone: it is still kept
+    frontend.body_index.df['huge'] = 400
+    assert frontend._body_terms(('huge',), N) == ['huge']
+    assert frontend._body_terms(('missing',), N) == []
+
+
+def test_search_body_with_only_common_terms(frontend, tmp_path):
+    frontend.BUCKET_NAME = None
+    docs = {d: ['common'] * (d % 3 + 1) for d in range(1, 101)}
+    frontend.body_index = _local_index(tmp_path, docs)
+    # 250 documents, so the IDF of 'common' (df 100) is log10(2.5) < MIN_BODY_IDF
+    norms = {d: 1.0 for d in range(1, 251)}
+    frontend.doc_norms = frontend.inv_doc_norms = sf.DocValues.from_dict(norms, np.float64)
+    assert frontend._idf('common', len(norms)) < sf.MIN_BODY_IDF
+    results = frontend.search_body('common')
+    assert len(results) == 100 and {int(d) for d, _ in results[:33]} == {d for d in docs if d % 3 == 2}
+
+
+def test_frontends_are_not_kept_alive_by_fork_hooks():
+    ref = weakref.ref(sf.SearchFrontend())
+    gc.collect()
+    assert ref() is None
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_frontend_reset_after_fork(frontend):
+    lock, frontend._storage_client = frontend._client_lock, object()
+    pid = os.fork()
+    if pid == 0:
+        ok = frontend._storage_client is None and frontend._client_lock is not lock
+        os._exit(0 if ok and sf.frontend._storage_client is None else 1)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0 and frontend._client_lock is lock
@@ -0,0 +1,136 @@
+"""
+Tests for building an InvertedIndex in memory and reading its posting lists
+back through the query-time APIs.
+
+Run with: python -m pytest -q tests
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import inverted_index_gcp as ig
+from test_codecs import (EDGE_CASES, _assert_same, _expected_postings, _index_for, _write_compressed,
+                         _write_fixed_width, small_blocks)  # noqa: F401 (pytest fixture)
+
+
+def test_write_posting_lists_from_docs(tmp_path, small_blocks):
+    docs = {0: ['a', 'b', 'a'], 2 ** 31 + 5: ['a'], 2 ** 32 - 1: ['b', 'c']}
+    docs.update({i: ['a'] * (i % 7 + 1) for i in range(1, 3000)})
+    index = ig.InvertedIndex(docs)
+    index.write_posting_lists(str(tmp_path), 0)
+    assert index.df == Counter(w for tokens in docs.values() for w in set(tokens))
+    for w in ('a', 'b', 'c'):
+        expected = sorted((d, Counter(tokens)[w]) for d, tokens in docs.items() if w in tokens)
+        doc_ids, tfs = index.read_a_posting_array(str(tmp_path), w)
+        assert list(zip(doc_ids.tolist(), tfs.tolist())) == expected
+
+
+@pytest.mark.parametrize('case', sorted(EDGE_CASES))
+def test_packed_cache_round_trip(case):
+    doc_ids, tfs = EDGE_CASES[case]
+    packed = ig._pack_cached_posting(doc_ids, tfs)
+    _assert_same(ig._unpack_cached_posting(packed), (doc_ids, tfs))
+    assert ig._packed_nbytes(packed) <= doc_ids.nbytes + tfs.nbytes
+
+
+def test_cache_keeps_lists_packed(tmp_path):
+    index = ig.InvertedIndex({i: ['a'] for i in range(1000, 3000)})
+    index.write_posting_lists(str(tmp_path), 0)
+    doc_ids, tfs = index.read_a_posting_array(str(tmp_path), 'a')
+    first, gaps, cached_tfs = index._posting_cache[(str(tmp_path), 'a', None)]
+    assert first == 1000 and gaps.dtype == np.uint8 and cached_tfs.dtype == np.uint8
+    assert index._posting_cache_bytes == gaps.nbytes + cached_tfs.nbytes
+    _assert_same(index.read_a_posting_array(str(tmp_path), 'a'), (doc_ids, tfs))
+
+
+def _streamed(index, base_dir, w):
+    postings = list(index.iter_posting(base_dir, w))
+    return np.array([d for d, _ in postings]), np.array([tf for _, tf in postings])
+
+
+@pytest.mark.parametrize('write', [_write_compressed, _write_fixed_width])
+def test_iter_posting_across_block_boundaries(tmp_path, small_blocks, write):
+    postings = _expected_postings()
+    index = _index_for(postings, write(tmp_path, postings))
+    base_dir = str(tmp_path)
+    for w, expected in postings.items():
+        _assert_same(_streamed(index, base_dir, w), expected)  # From the files
+        _assert_same(_streamed(index, base_dir, w), expected)  # From the cache, if cached
+    # Compressed lists are decoded whole, so they are cached for the next lookup
+    assert len(index._posting_cache) == (len(postings) if write is _write_compressed else 0)
+    assert list(index.iter_posting(base_dir, 'missing')) == []
+
+
+def test_iter_posting_stops_early(tmp_path, small_blocks):
+    postings = _expected_postings()
+    index = _index_for(postings, _write_fixed_width(tmp_path, postings))
+    first = next(index.iter_posting(str(tmp_path), 'long_sparse'))
+    assert first == (int(postings['long_sparse'][0][0]), int(postings['long_sparse'][1][0]))
+
+
+def test_warm_posting_cache_reads_each_file_once(tmp_path, small_blocks, monkeypatch):
+    docs = {d: ['w%d' % (d % k) for k in (3, 7, 50, 400)] for d in range(1, 4000)}
+    index = ig.InvertedIndex(docs)
+    index.write_posting_lists(str(tmp_path), 0)
+    base_dir = str(tmp_path)
+    reads = []
+    read_range = ig.MultiFileReader._read_range
+    monkeypatch.setattr(ig.MultiFileReader, '_read_range',
+                        lambda self, *r: reads.append(r) or read_range(self, *r))
+
+    loaded = index.warm_posting_cache(base_dir, 100, term_filter=lambda w: w != 'w0')
+    assert 'w0' not in loaded and len(loaded) == 100
+    assert sorted(loaded, key=lambda w: -index.df[w]) == loaded
+    files = {f for f, _, _ in reads}
+    assert len(reads) == len(files) < len(loaded)  # One read per file, not per term
+
+    uncached = _index_for({w: (np.empty(index.df[w]), None) for w in index.df}, index.posting_locs)
+    expected = {w: uncached.read_a_posting_array(base_dir, w) for w in loaded}
+    reads.clear()
+    for w in loaded:
+        _assert_same(index.read_a_posting_array(base_dir, w), expected[w])
+    assert reads == []  # Already cached
+
+
+def test_warm_posting_cache_budget(tmp_path, monkeypatch):
+    index = ig.InvertedIndex({d: ['w%d' % (d % k) for k in (3, 7, 50)] for d in range(1, 4000)})
+    index.write_posting_lists(str(tmp_path), 0)
+    monkeypatch.setattr(ig, 'POSTING_CACHE_BYTES', 2000)
+    loaded = index.warm_posting_cache(str(tmp_path), 100)
+    assert 0 < len(loaded) < 100
+    assert index._posting_cache_bytes < ig.POSTING_CACHE_BYTES
+
+
+def test_read_posting_arrays_shares_one_pool(tmp_path):
+    docs = {d: ['w%d' % (d % k) for k in (3, 7, 50)] for d in range(1, 2000)}
+    index = ig.InvertedIndex(docs)
+    index.write_posting_lists(str(tmp_path), 0)
+    words = ['w1', 'w2', 'w3', 'missing', 'w1']
+    postings = index.read_posting_arrays(str(tmp_path), words)
+    assert list(postings) == ['w1', 'w2', 'w3', 'missing']
+    assert len(postings['w1'][0]) == index.df['w1'] and len(postings['missing'][0]) == 0
+    pool = ig._term_read_pool()
+    n_threads = threading.active_count()
+    for _ in range(20):
+        index.read_posting_arrays(str(tmp_path), ['w4', 'w5', 'w6'])
+    assert ig._term_read_pool() is pool and threading.active_count() <= n_threads + ig.TERM_READ_WORKERS
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_term_read_pool_after_fork(tmp_path):
+    index = ig.InvertedIndex({d: ['a', 'b'] for d in range(1, 100)})
+    index.write_posting_lists(str(tmp_path), 0)
+    pool = ig._term_read_pool()
+    pid = os.fork()
+    if pid == 0:
+        postings = index.read_posting_arrays(str(tmp_path), ['a', 'b'])
+        os._exit(0 if ig._term_read_pool() is not pool and len(postings['b'][0]) == 99 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0